@@ -1,31 +1,50 @@
+import importlib
+import time
+
 from flask import Flask
 from flask_cors import CORS
 
+from app.config import Config
+
+# (module, blueprint attribute), in registration order
+BLUEPRINTS = [
+    ("app.routes.govscheme", "govscheme_bp"),
+    ("app.routes.translate", "translate_bp"),
+    ("app.routes.plant_disease", "plant_disease_bp"),
+    ("app.routes.postharvest", "postharvest_bp"),
+    ("app.routes.agri_advisory", "agri_advisory_bp"),
+    ("app.routes.fertilizer", "fertilizer_bp"),
+    ("app.routes.market", "weather_market_bp"),
+    ("app.routes.crop_suggestion", "crop_suggestion_bp"),
+    ("app.routes.crop_calendar", "crop_calendar_bp"),
+    ("app.routes.water_management", "water_management_bp"),
+    ("app.routes.health", "health_bp"),
+]
+
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__)
     CORS(app)
 
-    # Register blueprints
-    from app.routes.govscheme import govscheme_bp
-    from app.routes.translate import translate_bp
-    from app.routes.plant_disease import plant_disease_bp
-    from app.routes.postharvest import postharvest_bp
-    from app.routes.agri_advisory import agri_advisory_bp
-    from app.routes.fertilizer import fertilizer_bp
-    from app.routes.market import weather_market_bp
-    from app.routes.crop_suggestion import crop_suggestion_bp
-    from app.routes.crop_calendar import crop_calendar_bp
-    from app.routes.water_management import water_management_bp
-
-    app.register_blueprint(govscheme_bp)
-    app.register_blueprint(translate_bp)
-    app.register_blueprint(plant_disease_bp)
-    app.register_blueprint(postharvest_bp)
-    app.register_blueprint(agri_advisory_bp)
-    app.register_blueprint(fertilizer_bp)
-    app.register_blueprint(weather_market_bp)
-    app.register_blueprint(crop_suggestion_bp)
-    app.register_blueprint(crop_calendar_bp)
-    app.register_blueprint(water_management_bp)
+    # Register blueprints, timing each import. Timings are inclusive, so a
+    # module that is first to import a shared dependency carries its cost.
+    import_seconds = {}
+    for module_name, attr in BLUEPRINTS:
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        app.register_blueprint(getattr(module, attr))
+        import_seconds[module_name] = round(time.perf_counter() - start, 3)
+
+    app.config["STARTUP_REPORT"] = {
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "import_seconds": import_seconds,
+    }
+
+    # Heavy components otherwise load on first use; optionally start
+    # loading them in the background so the first user does not pay for it.
+    # /health/ready answers 503 until this warmup has finished.
+    if Config.WARMUP_ON_START:
+        from app.services import lazy
+        lazy.start_warmup()
 
     return app
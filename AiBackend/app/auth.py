@@ -0,0 +1,19 @@
+import hmac
+from functools import wraps
+
+from flask import request, jsonify
+
+from app.config import Config
+
+
+def admin_required(view):
+    """Allow the request only with a matching X-Admin-Token header."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not Config.ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled"}), 403
+        token = request.headers.get("X-Admin-Token", "")
+        if not hmac.compare_digest(token.encode(), Config.ADMIN_TOKEN.encode()):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -5,3 +6,143 @@ load_dotenv()
 
 class Config:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+    # ==== GROQ HTTP CLIENT ====
+    GROQ_URL = os.getenv("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
+    GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "20"))
+    GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+    GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "60"))
+    GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+    GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "0.5"))
+    GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "8"))
+
+    # ==== WEATHER (Open-Meteo) ====
+    WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "10"))
+    WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "1800"))
+    WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "4096"))
+    # 2 decimals is a ~1.1 km cell, well inside a forecast grid point
+    WEATHER_GRID_DECIMALS = int(os.getenv("WEATHER_GRID_DECIMALS", "2"))
+
+    # ==== SOIL (OpenEPI) ====
+    SOIL_TIMEOUT = float(os.getenv("SOIL_TIMEOUT", "10"))
+    SOIL_CACHE_PATH = os.getenv("SOIL_CACHE_PATH", "./app/cache/soil.sqlite3")
+    # Cell edge in degrees; 0.01 is ~1.1 km, coarser than a typical farm
+    SOIL_GRID_DEG = float(os.getenv("SOIL_GRID_DEG", "0.01"))
+
+    # ==== RETRIEVAL ====
+    EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+    VECTOR_PERSIST_DIR = os.getenv("VECTOR_PERSIST_DIR", "./app/chromadb")
+    VECTOR_COLLECTION = os.getenv("VECTOR_COLLECTION", "agri_collection")
+    # "chroma" or "faiss" (memory-mapped copy built by build_faiss_index.py)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "./app/faiss")
+    # Search breadth: IVF lists probed / HNSW candidate list size
+    FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+    FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+    # ==== STARTUP ====
+    # Load models, vector store and agents in a background thread at boot;
+    # /health/ready reports not ready until it finishes
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() == "true"
+
+    # ==== CACHES ====
+    # SQLite file shared by every worker on the host
+    CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "./app/cache/cache.sqlite3")
+    # SQLite connections a worker keeps open per database file
+    SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "512"))
+    # Seconds a completion stays cached, per endpoint; override with a JSON
+    # object in LLM_CACHE_TTLS, e.g. '{"govscheme": 3600}'
+    LLM_CACHE_TTLS = {
+        "default": 6 * 3600,
+        "govscheme": 24 * 3600,
+        "translate": 7 * 24 * 3600,
+        "plant_disease": 24 * 3600,
+        "plant_treatment": 7 * 24 * 3600,
+        "fertilizer": 6 * 3600,
+        "crop_calendar": 6 * 3600,
+        "crop_suggestion": 6 * 3600,
+        "postharvest": 6 * 3600,
+        "water_management": 3 * 3600,
+        **json.loads(os.getenv("LLM_CACHE_TTLS", "{}")),
+    }
+
+    # ==== ADMIN ====
+    # Token expected in the X-Admin-Token header; admin endpoints are disabled when unset
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+    # ==== SEMANTIC CACHE (/govscheme) ====
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    # Cosine similarity above which a previous answer is reused
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.90"))
+    SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+    SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # ==== TRANSLATE (/translate) ====
+    TRANSLATE_MAX_PAGES = int(os.getenv("TRANSLATE_MAX_PAGES", "60"))
+    # Estimated input tokens explained per request; pages past this are skipped
+    TRANSLATE_MAX_INPUT_TOKENS = int(os.getenv("TRANSLATE_MAX_INPUT_TOKENS", "60000"))
+    # Documents up to this size go to the model in one prompt, larger ones are chunked
+    TRANSLATE_SINGLE_PASS_TOKENS = int(os.getenv("TRANSLATE_SINGLE_PASS_TOKENS", "6000"))
+    TRANSLATE_CHUNK_TOKENS = int(os.getenv("TRANSLATE_CHUNK_TOKENS", "3000"))
+    TRANSLATE_WORKERS = int(os.getenv("TRANSLATE_WORKERS", "4"))
+    # Hard limits: larger uploads are rejected with 413 before any processing
+    TRANSLATE_MAX_UPLOAD_MB = int(os.getenv("TRANSLATE_MAX_UPLOAD_MB", "25"))
+    TRANSLATE_MAX_UPLOAD_PAGES = int(os.getenv("TRANSLATE_MAX_UPLOAD_PAGES", "500"))
+
+    # ==== PLANT DISEASE (/plant-disease) ====
+    # Longer image side sent to the vision model; larger photos are downscaled
+    VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1024"))
+    VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+    # Photos whose 64-bit dHashes differ in at most this many bits share a diagnosis
+    PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "4"))
+    PHASH_CACHE_SIZE = int(os.getenv("PHASH_CACHE_SIZE", "2048"))
+    PHASH_CACHE_TTL = float(os.getenv("PHASH_CACHE_TTL", str(7 * 24 * 3600)))
+    # Deferred treatments (defer_treatment=true): generation pool and ticket lifetime
+    TREATMENT_WORKERS = int(os.getenv("TREATMENT_WORKERS", "4"))
+    TREATMENT_TICKET_TTL = int(os.getenv("TREATMENT_TICKET_TTL", "3600"))
+    # How long a streamed follow-up waits for a pending treatment
+    TREATMENT_STREAM_WAIT = int(os.getenv("TREATMENT_STREAM_WAIT", "60"))
+
+    # ==== AGRI ADVISORY (/advisory/ask) ====
+    # crewai agent/crew step logging; very chatty, so off unless debugging
+    ADVISORY_VERBOSE = os.getenv("ADVISORY_VERBOSE", "false").lower() == "true"
+    # Agent sets a worker builds and reuses; concurrent runs beyond this wait
+    ADVISORY_AGENT_POOL = int(os.getenv("ADVISORY_AGENT_POOL", "4"))
+    # "passages": the RAG tool returns retrieved chunks directly (no extra LLM call);
+    # "qa": it summarises them with a RetrievalQA chain first
+    ADVISORY_RAG_MODE = os.getenv("ADVISORY_RAG_MODE", "passages").lower()
+    ADVISORY_RAG_K = int(os.getenv("ADVISORY_RAG_K", "3"))
+    ADVISORY_RAG_CACHE_SIZE = int(os.getenv("ADVISORY_RAG_CACHE_SIZE", "1024"))
+    ADVISORY_RAG_CACHE_TTL = float(os.getenv("ADVISORY_RAG_CACHE_TTL", "3600"))
+    # Minimum cosine similarity to a category centroid; below it the keyword rules route
+    ADVISORY_ROUTER_THRESHOLD = float(os.getenv("ADVISORY_ROUTER_THRESHOLD", "0.35"))
+
+    # ==== GOVSCHEME BATCH (/govscheme/batch) ====
+    GOVSCHEME_BATCH_MAX = int(os.getenv("GOVSCHEME_BATCH_MAX", "100"))
+    # Concurrent Groq calls per worker across all batch requests
+    GOVSCHEME_BATCH_CONCURRENCY = int(os.getenv("GOVSCHEME_BATCH_CONCURRENCY", "8"))
+
+    # ==== UPSTREAM FAN-OUT ====
+    # Threads per worker for concurrent soil/weather lookups: enough for every
+    # request thread's calls at once (fertilizer fans out up to 3), so none
+    # queue behind another request; gunicorn.conf.py sets it from its threads
+    FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "96"))
+    # Per-upstream deadlines for /api/fertilizer_recommendation; late data falls back to defaults
+    FERTILIZER_SOIL_DEADLINE = float(os.getenv("FERTILIZER_SOIL_DEADLINE", "4"))
+    FERTILIZER_WEATHER_DEADLINE = float(os.getenv("FERTILIZER_WEATHER_DEADLINE", "3"))
+
+    # ==== WEATHER-MARKET (/api/weather-market) ====
+    # Per-city/per-crop answers: served as is while fresh, served and refreshed in
+    # the background while stale, refetched synchronously once past the stale limit
+    MARKET_FRESH_TTL = float(os.getenv("MARKET_FRESH_TTL", "3600"))
+    MARKET_STALE_TTL = float(os.getenv("MARKET_STALE_TTL", str(6 * 3600)))
+    # An item the model returned no row for is remembered as empty this long
+    MARKET_EMPTY_TTL = float(os.getenv("MARKET_EMPTY_TTL", "900"))
+    # Background refresher: how often it runs and how many popular items it keeps warm
+    MARKET_REFRESH_ENABLED = os.getenv("MARKET_REFRESH_ENABLED", "true").lower() == "true"
+    MARKET_REFRESH_INTERVAL = float(os.getenv("MARKET_REFRESH_INTERVAL", "600"))
+    MARKET_REFRESH_TOP = int(os.getenv("MARKET_REFRESH_TOP", "20"))
+    # At most one worker refreshes the same items within this window
+    MARKET_REFRESH_LEASE = float(os.getenv("MARKET_REFRESH_LEASE", "300"))
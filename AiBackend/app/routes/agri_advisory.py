@@ -1,38 +1,124 @@
+import hashlib
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from flask import Blueprint, request, jsonify
-from crewai import Agent, Task, Crew, Process, LLM
-from crewai.tools import tool
-from langchain.embeddings import HuggingFaceEmbeddings  
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
+
+from app.config import Config
+from app.services import metrics, retrieval, sse
+from app.services.cache import TTLCache
+from app.services.lazy import LazyResource
+from app.services.pool import Pool
 
 agri_advisory_bp = Blueprint('agri_advisory', __name__)
 
+# crewai and langchain are imported inside the loaders below so that
+# importing this blueprint stays cheap; they load on the first advisory call
+# or on /health/warmup.
+
 # ==== CONFIGURATION ====
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-llm = LLM(api_key=GROQ_API_KEY, model="groq/llama-3.3-70b-versatile")
 
-# ==== VECTOR STORE ====
-EMBED_MODEL = "all-MiniLM-L6-v2"
-PERSIST_DIR = "./app/chromadb"
-COLLECTION = "agri_collection"
+def _build_llm():
+    from crewai import LLM
+    return LLM(api_key=GROQ_API_KEY, model="groq/llama-3.3-70b-versatile")
 
-embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-vectorstore = Chroma(
-    persist_directory=PERSIST_DIR,
-    embedding_function=embeddings
-)
-retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3})
+crew_llm = LazyResource("advisory_llm", _build_llm)
 
 # ==== TOOL ====
-@tool("RAG Search Tool")
-def retrieve_context(query: str) -> str:
-    """Retrieve context from agricultural documents."""
-    qa = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type="stuff")
-    return qa.run(query)
+# "passages" mode (default) hands the agent the retrieved chunks directly; the
+# agent's own LLM call reads them, so a tool call costs no extra round trip.
+# "qa" mode keeps the older behaviour of summarising them with a RetrievalQA
+# chain first.
+passage_cache = TTLCache(maxsize=Config.ADVISORY_RAG_CACHE_SIZE, ttl=Config.ADVISORY_RAG_CACHE_TTL)
+
+# Per-run counters and the passages already shown to the agent, kept on the
+# thread that runs the crew (crewai calls tools synchronously on it)
+_run_state = threading.local()
+
+def _passage_id(text: str) -> str:
+    return hashlib.sha1(" ".join(text.split()).lower().encode("utf-8")).hexdigest()
+
+
+def retrieve_passages(query: str) -> list[dict]:
+    """Top distinct chunks for `query`, cached per normalised query."""
+    key = " ".join(query.lower().split())
+    passages = passage_cache.get(key)
+    metrics.incr(f"advisory.passage_cache.{'hit' if passages is not None else 'miss'}")
+    if passages is None:
+        passages, seen = [], set()
+        # Over-fetch a little so duplicate chunks do not shrink the result
+        for doc in retrieval.retrieve(query, k=Config.ADVISORY_RAG_K + 2):
+            passage_id = _passage_id(doc.page_content)
+            if passage_id in seen:
+                continue
+            seen.add(passage_id)
+            passages.append({
+                "id": passage_id,
+                "source": doc.metadata.get("source", "<unknown>"),
+                "text": doc.page_content.strip()
+            })
+            if len(passages) == Config.ADVISORY_RAG_K:
+                break
+        passage_cache.set(key, passages)
+    return passages
+
+
+def format_passages(passages: list[dict]) -> str:
+    """Render passages for the agent, eliding ones it was already given this run."""
+    shown = getattr(_run_state, "shown", None)
+    if shown is None:
+        shown = set()
+    blocks = []
+    for number, passage in enumerate(passages, start=1):
+        if passage["id"] in shown:
+            blocks.append(f"[{number}] (same passage as returned by an earlier search)")
+        else:
+            blocks.append(f"[{number}] Source: {passage['source']}\n{passage['text']}")
+        shown.add(passage["id"])
+    return "\n\n".join(blocks) if blocks else "No relevant documents found."
+
+
+def _count(counter: str):
+    setattr(_run_state, counter, getattr(_run_state, counter, 0) + 1)
+
+
+def _build_qa_chain():
+    from langchain.chains import RetrievalQA
+    return RetrievalQA.from_chain_type(
+        llm=crew_llm.get(), retriever=retrieval.get_retriever(k=Config.ADVISORY_RAG_K), chain_type="stuff"
+    )
+
+qa_chain = LazyResource("advisory_qa_chain", _build_qa_chain, enabled=lambda: Config.ADVISORY_RAG_MODE == "qa")
+
+def _build_rag_tool():
+    from crewai.tools import tool
+
+    @tool("RAG Search Tool")
+    def retrieve_context(query: str) -> str:
+        """Retrieve context from agricultural documents."""
+        _count("tool_calls")
+        if Config.ADVISORY_RAG_MODE == "qa":
+            _count("tool_llm_calls")
+            return qa_chain.get().run(query)
+        return format_passages(retrieve_passages(query))
+
+    return retrieve_context
+
+rag_tool = LazyResource("advisory_rag_tool", _build_rag_tool)
 
 # ==== AGENTS ====
+# Agent sets are built on demand, at most ADVISORY_AGENT_POOL per worker, and
+# reused by later requests. Each run checks a set out for its duration: a
+# crewai Agent keeps the executor of its current run on itself, so
+# concurrent kickoffs on one Agent would interfere.
+
 def create_agents():
+    from crewai import Agent
+
+    llm = crew_llm.get()
+    retrieve_context = rag_tool.get()
     return {
         "agri_advisor": Agent(
             role="Agricultural Advisor",
@@ -40,7 +126,7 @@ def create_agents():
             backstory="Expert in crop patterns, fertilizers, and modern techniques.",
             tools=[retrieve_context],
             llm=llm,
-            verbose=True
+            verbose=Config.ADVISORY_VERBOSE
         ),
         "pest_diagnoser": Agent(
             role="Pest & Disease Assistant",
@@ -48,7 +134,7 @@ def create_agents():
             backstory="Expert in crop pathology and pest management.",
             tools=[retrieve_context],
             llm=llm,
-            verbose=True
+            verbose=Config.ADVISORY_VERBOSE
         ),
         "organic_expert": Agent(
             role="Organic Farming Advisor",
@@ -56,7 +142,7 @@ def create_agents():
             backstory="Experienced organic farmer with in-depth knowledge of sustainable practices.",
             tools=[retrieve_context],
             llm=llm,
-            verbose=True
+            verbose=Config.ADVISORY_VERBOSE
         ),
         "govt_scheme_expert": Agent(
             role="Schemes & Subsidy Assistant",
@@ -64,7 +150,7 @@ def create_agents():
             backstory="Government schemes specialist for rural development.",
             tools=[retrieve_context],
             llm=llm,
-            verbose=True
+            verbose=Config.ADVISORY_VERBOSE
         ),
         "soil_analyzer": Agent(
             role="Soil Health Analyzer",
@@ -72,11 +158,190 @@ def create_agents():
             backstory="Soil scientist trained in analyzing pH, nutrients, and productivity indicators.",
             tools=[retrieve_context],
             llm=llm,
-            verbose=True
+            verbose=Config.ADVISORY_VERBOSE
         )
     }
 
-# ==== CATEGORY CLASSIFIER ====
+agent_pool = Pool(create_agents, Config.ADVISORY_AGENT_POOL)
+
+# ==== TASKS ====
+CATEGORY_TASKS = {
+    "agriculture": {
+        "agent": "agri_advisor",
+        "description": "Give agricultural advice for the query: '{topic}'.",
+        "expected_output": "List of crop practices, irrigation tips, and fertilizer suggestions."
+    },
+    "pest": {
+        "agent": "pest_diagnoser",
+        "description": "Diagnose pests/diseases and suggest remedies for: '{topic}'.",
+        "expected_output": "List of symptoms, possible pests/diseases, and treatment options."
+    },
+    "organic": {
+        "agent": "organic_expert",
+        "description": "Suggest organic farming practices for: '{topic}'.",
+        "expected_output": "List of eco-friendly farming methods and natural pesticides/fertilizers."
+    },
+    "scheme": {
+        "agent": "govt_scheme_expert",
+        "description": "Find government schemes related to: '{topic}'.",
+        "expected_output": "List of schemes, benefits, eligibility, and application process."
+    },
+    "soil": {
+        "agent": "soil_analyzer",
+        "description": "Analyze soil health for: '{topic}' and suggest improvements.",
+        "expected_output": "Interpretation of soil properties and recommended actions."
+    }
+}
+
+def build_crew(agents: dict, category: str, topic: str):
+    """A single-task crew for `category`, run by its agent from `agents`."""
+    from crewai import Task, Crew, Process
+
+    spec = CATEGORY_TASKS[category]
+    agent = agents[spec["agent"]]
+    task = Task(
+        description=spec["description"].format(topic=topic),
+        expected_output=spec["expected_output"],
+        agent=agent
+    )
+    return Crew(
+        agents=[agent],
+        tasks=[task],
+        process=Process.sequential,
+        verbose=Config.ADVISORY_VERBOSE
+    )
+
+def token_totals(agents: dict) -> tuple[int, int]:
+    """(successful LLM requests, total tokens) the agents have used so far."""
+    summaries = [agent._token_process.get_summary() for agent in agents.values()]
+    return (
+        sum(summary.successful_requests for summary in summaries),
+        sum(summary.total_tokens for summary in summaries)
+    )
+
+def run_crew(category: str, topic: str):
+    """
+    Run the `category` crew on a pooled agent set and return (result, usage),
+    where usage counts the LLM round trips this request made: the agent's own
+    calls as reported by crewai plus any the RAG tool made.
+    """
+    _run_state.shown = set()
+    _run_state.tool_calls = 0
+    _run_state.tool_llm_calls = 0
+
+    with agent_pool.use() as agents:
+        # crewai appends every tool result to the agent and never clears it;
+        # on a pooled agent that would grow forever and leak between requests
+        for agent in agents.values():
+            agent.tools_results.clear()
+        # The crew's token_usage sums each agent's lifetime counters, which a
+        # pooled agent carries over from earlier runs; report this run's delta
+        before = token_totals(agents)
+        result = build_crew(agents, category, topic).kickoff(inputs={"topic": topic})
+        agent_llm_calls, total_tokens = (
+            after - start for after, start in zip(token_totals(agents), before)
+        )
+
+    usage = {
+        "llm_round_trips": agent_llm_calls + _run_state.tool_llm_calls,
+        "agent_llm_calls": agent_llm_calls,
+        "tool_llm_calls": _run_state.tool_llm_calls,
+        "tool_calls": _run_state.tool_calls,
+        "total_tokens": total_tokens,
+        "rag_mode": Config.ADVISORY_RAG_MODE
+    }
+    metrics.incr("advisory.requests")
+    metrics.incr("advisory.llm_round_trips", usage["llm_round_trips"])
+    metrics.incr("advisory.tool_calls", usage["tool_calls"])
+    return result, usage
+
+# Runs crews for streaming requests while the response relays progress
+crew_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="advisory")
+HEARTBEAT_SECONDS = 3
+
+# ==== CATEGORY ROUTER ====
+# Each category is represented by the centroid of a few example queries in
+# the shared MiniLM space; a query goes to the category whose centroid is
+# most similar. Below ADVISORY_ROUTER_THRESHOLD the keyword rules decide.
+CATEGORY_EXAMPLES = {
+    "agriculture": [
+        "What is the best time to sow wheat?",
+        "How much water does paddy need and how often should I irrigate?",
+        "Which crop practices increase maize yield?",
+        "Spacing and seed rate for groundnut",
+        "गेहूं की बुवाई का सही समय क्या है?",
+    ],
+    "pest": [
+        "Leaves of my tomato plant have brown spots and are curling",
+        "White insects under cotton leaves, how to control them?",
+        "Worms are eating my brinjal fruits",
+        "Fungus on chilli plants, what spray should I use?",
+        "धान में कीट लग गए हैं, क्या दवा डालें?",
+    ],
+    "organic": [
+        "How to make jeevamrutham and vermicompost at home?",
+        "Natural pesticide with neem for vegetables",
+        "How can I convert my farm to organic farming?",
+        "Bio fertilizers instead of urea",
+        "जैविक खेती कैसे शुरू करें?",
+    ],
+    "scheme": [
+        "How do I apply for PM-KISAN?",
+        "Is there a subsidy for drip irrigation?",
+        "Crop loan and Kisan Credit Card eligibility",
+        "Government insurance scheme for crop loss",
+        "किसान योजना के लिए आवेदन कैसे करें?",
+    ],
+    "soil": [
+        "My soil pH is 8.5, how do I correct it?",
+        "Soil test shows low nitrogen and potassium",
+        "How to improve soil fertility and organic carbon?",
+        "My field is saline, what should I do?",
+        "मिट्टी की जांच रिपोर्ट को कैसे समझें?",
+    ],
+}
+
+def _build_router() -> tuple[list[str], np.ndarray]:
+    """(categories, unit centroid matrix of shape [categories, dim])."""
+    categories = list(CATEGORY_EXAMPLES)
+    examples = [text for category in categories for text in CATEGORY_EXAMPLES[category]]
+    vectors = np.asarray(retrieval.get_embeddings().embed_documents(examples), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    centroids, start = [], 0
+    for category in categories:
+        count = len(CATEGORY_EXAMPLES[category])
+        centroid = vectors[start:start + count].mean(axis=0)
+        centroids.append(centroid / np.linalg.norm(centroid))
+        start += count
+    return categories, np.stack(centroids)
+
+router = LazyResource("advisory_router", _build_router)
+
+def route_topic(topic: str, vector=None) -> dict:
+    """
+    Pick the advisory category for `topic`. Pass `vector` when the query is
+    already embedded; otherwise it is embedded here.
+    """
+    try:
+        categories, centroids = router.get()
+        if vector is None:
+            vector = retrieval.embed_query(topic)
+        query = np.asarray(vector, dtype=np.float32)
+        scores = centroids @ (query / np.linalg.norm(query))
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+    except Exception as e:
+        print(f"[ERROR] Embedding router failed, using keywords: {e}")
+        score = None
+
+    if score is not None and score >= Config.ADVISORY_ROUTER_THRESHOLD:
+        metrics.incr("advisory.router.embedding")
+        return {"category": categories[best], "method": "embedding", "score": round(score, 3)}
+
+    metrics.incr("advisory.router.keyword_fallback")
+    return {"category": classify_topic(topic), "method": "keywords", "score": score and round(score, 3)}
+
 def classify_topic(topic: str) -> str:
     topic_lower = topic.lower()
     if any(kw in topic_lower for kw in ["pest", "disease", "infection", "infestation", "worm", "fungus"]):
@@ -99,52 +364,37 @@ def advisory():
     if not topic:
         return jsonify({"error": "Missing 'topic' in request body"}), 400
 
-    agents = create_agents()
-    category = classify_topic(topic)
-
-    category_to_task = {
-        "agriculture": Task(
-            description=f"Give agricultural advice for the query: '{topic}'.",
-            expected_output="List of crop practices, irrigation tips, and fertilizer suggestions.",
-            agent=agents["agri_advisor"]
-        ),
-        "pest": Task(
-            description=f"Diagnose pests/diseases and suggest remedies for: '{topic}'.",
-            expected_output="List of symptoms, possible pests/diseases, and treatment options.",
-            agent=agents["pest_diagnoser"]
-        ),
-        "organic": Task(
-            description=f"Suggest organic farming practices for: '{topic}'.",
-            expected_output="List of eco-friendly farming methods and natural pesticides/fertilizers.",
-            agent=agents["organic_expert"]
-        ),
-        "scheme": Task(
-            description=f"Find government schemes related to: '{topic}'.",
-            expected_output="List of schemes, benefits, eligibility, and application process.",
-            agent=agents["govt_scheme_expert"]
-        ),
-        "soil": Task(
-            description=f"Analyze soil health for: '{topic}' and suggest improvements.",
-            expected_output="Interpretation of soil properties and recommended actions.",
-            agent=agents["soil_analyzer"]
-        )
-    }
-
-    selected_task = category_to_task[category]
-    selected_agent = selected_task.agent
+    category = route_topic(topic)["category"]
 
-    crew = Crew(
-        agents=[selected_agent],
-        tasks=[selected_task],
-        process=Process.sequential,
-        verbose=True
-    )
+    if sse.wants_stream():
+        return sse.sse_response(stream_crew(category, topic))
 
     try:
-        result = crew.kickoff(inputs={"topic": topic})
+        result, usage = run_crew(category, topic)
         return jsonify({
             "result": str(result),
-            "selected_category": category
+            "selected_category": category,
+            "usage": usage
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def stream_crew(category, topic):
+    """
+    SSE events for a crew run. The agent's answer only exists once its
+    reasoning loop finishes, so the stream sends the chosen category right
+    away, a heartbeat while the crew works, then the usual body as `done`.
+    """
+    yield sse.event({"stage": "routed", "selected_category": category}, "status")
+    future = crew_executor.submit(run_crew, category, topic)
+    while True:
+        try:
+            result, usage = future.result(timeout=HEARTBEAT_SECONDS)
+            break
+        except TimeoutError:
+            yield sse.event({"stage": "working"}, "status")
+        except Exception as e:
+            yield sse.event({"error": str(e)}, "error")
+            return
+    yield sse.event({"result": str(result), "selected_category": category, "usage": usage}, "done")
@@ -1,16 +1,14 @@
 from flask import Blueprint, request, jsonify
-import os
-import requests
 from dotenv import load_dotenv
 from typing import List
 
 from pydantic import BaseModel, Field
-from langchain.output_parsers import PydanticOutputParser
+
+from app.services import prompts, structured, weather
 
 load_dotenv()
 
 crop_calendar_bp = Blueprint("crop_calendar_bp", __name__)
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 
 # -------------------- Pydantic Response Schema --------------------
@@ -30,25 +28,6 @@ class CropCalendar(BaseModel):
     calendar: List[WeekPlan] = Field(..., description="Weekly farming plan")
 
 
-# -------------------- Helper: Weather Fetch --------------------
-
-def get_weather_forecast(lat, lon):
-    try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}"
-            f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,wind_speed_10m_max,"
-            f"relative_humidity_2m_max,relative_humidity_2m_min"
-            f"&forecast_days=7&timezone=auto"
-        )
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json().get("daily", {})
-    except Exception as e:
-        print(f"[ERROR] Weather fetch failed: {e}")
-        return {}
-
-
 # -------------------- Main Route: Crop Calendar --------------------
 
 @crop_calendar_bp.route("/crop_calendar", methods=["POST"])
@@ -63,10 +42,9 @@ def crop_calendar():
     if not crop or not region or lat is None or lon is None :
         return jsonify({"error": "Missing crop, region or coordinates"}), 400
 
-    weather_info = get_weather_forecast(lat, lon)
+    weather_info = weather.get_daily_forecast(lat, lon)
 
-    parser = PydanticOutputParser(pydantic_object=CropCalendar)
-    format_instructions = parser.get_format_instructions()
+    format_instructions = prompts.format_instructions(CropCalendar)
 
     system_prompt = (
         "You are an expert agricultural officer. Based on the crop, region, and weather data, generate a detailed "
@@ -78,7 +56,7 @@ def crop_calendar():
     user_prompt = (
         f"Crop: {crop}\n"
         f"Region: {region}\n"
-        f"Weather Forecast: {weather_info}\n"
+        f"{prompts.weather_context(weather_info)}\n"
         f"Please reply in {lang} language only\n"
         "Now generate the farming calendar."
     )
@@ -91,21 +69,10 @@ def crop_calendar():
         ],
         "temperature": 0.4
     }
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    prompts.record_tokens("crop_calendar", payload)
 
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        content = response.json()["choices"][0]["message"]["content"]
-        structured_data = parser.parse(content)
+        structured_data = structured.complete(payload, CropCalendar, cache="crop_calendar")
 
         return jsonify(structured_data.dict()), 200
 
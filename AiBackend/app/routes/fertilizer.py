@@ -1,9 +1,9 @@
 from flask import Blueprint, request, jsonify
-import requests
-import os
 import datetime
 from dotenv import load_dotenv
-from groq import Groq
+
+from app.config import Config
+from app.services import fanout, llm_client, prompts, soil, sse, weather
 
 load_dotenv()
 
@@ -49,9 +49,10 @@ Use clear, jargon‑free language, and localize units & terminology for Indian f
 
 # ─── LLM FUNCTION ─────────────────────────────────────────────────────────────
 
-def get_fertilizer_recommendation(data, crop, lang):
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
+def build_fertilizer_payload(data, crop, lang):
+    # The prompt is the LLM cache key, so it carries today's date rather than
+    # a request timestamp, which would make every prompt unique
+    today = datetime.date.today().isoformat()
     user_prompt = f"""
 Please answer in {lang} language only.
 Provide a fertilizer recommendation for the crop: *{crop}* using the following data:
@@ -72,108 +73,71 @@ Weather Data:
 - Precipitation: {data['weather_data']['precipitation']} mm
 - Windspeed: {data['weather_data']['windspeed']} km/h
 
-Timestamp: {data['timestamp']}
+Date: {today}
 """
 
-    chat_completion = client.chat.completions.create(
-        model="llama3-70b-8192",
-        messages=[
+    payload = {
+        "model": "llama3-70b-8192",
+        "messages": [
             {"role": "system", "content": FERTILIZER_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
-        temperature=0.7
-    )
-
-    return chat_completion.choices[0].message.content.strip()
-
-# ─── HELPERS ──────────────────────────────────────────────────────────────────
-
-def get_soil_data(lat, lon):
-    try:
-        url = (
-            f"https://api.openepi.io/soil/property?"
-            f"lon={lon}&lat={lat}&depths=0-5cm&depths=0-30cm&"
-            f"properties=phh2o&properties=nitrogen&properties=soc&properties=clay&"
-            f"values=mean"
-        )
-        response = requests.get(url)
-        data = response.json()
-        properties = data.get('properties', [])
-
-        soil_data = {
-            "soil_ph": None,
-            "soil_organic_carbon": None,
-            "soil_nitrogen": None,
-            "soil_clay": None
-        }
-
-        for prop in properties:
-            if prop['property'] == 'phh2o':
-                soil_data['soil_ph'] = prop['depth_0_5']['mean']
-            elif prop['property'] == 'nitrogen':
-                soil_data['soil_nitrogen'] = prop['depth_0_5']['mean']
-            elif prop['property'] == 'soc':
-                soil_data['soil_organic_carbon'] = prop['depth_0_5']['mean']
-            elif prop['property'] == 'clay':
-                soil_data['soil_clay'] = prop['depth_0_5']['mean']
-
-        ocs_url = (
-            f"https://api.openepi.io/soil/property?"
-            f"lon={lon}&lat={lat}&depths=0-30cm&properties=ocs&values=mean"
-        )
-        ocs_response = requests.get(ocs_url)
-        if ocs_response.status_code == 200:
-            ocs_data = ocs_response.json()
-            for prop in ocs_data.get('properties', []):
-                if prop['property'] == 'ocs':
-                    soil_data['soil_organic_carbon_stock'] = prop['depth_0_30']['mean']
-
-        # Fill missing with defaults
-        defaults = {
-            "soil_ph": 6.5,
-            "soil_organic_carbon": 1.2,
-            "soil_nitrogen": 0.1,
-            "soil_clay": 20.0,
-            "soil_organic_carbon_stock": 50.0
-        }
-        for key in defaults:
-            if soil_data.get(key) is None:
-                soil_data[key] = defaults[key]
+        "temperature": 0.7
+    }
+    prompts.record_tokens("fertilizer", payload)
+    return payload
 
-        return soil_data
+def get_fertilizer_recommendation(data, crop, lang):
+    payload = build_fertilizer_payload(data, crop, lang)
+    return llm_client.chat_completion(payload, cache="fertilizer").strip()
 
-    except Exception as e:
-        print(f"[ERROR] Soil data fetch failed: {e}")
-        return {
-            "soil_ph": 6.5,
-            "soil_organic_carbon": 1.2,
-            "soil_nitrogen": 0.1,
-            "soil_clay": 20.0,
-            "soil_organic_carbon_stock": 50.0
-        }
+# ─── UPSTREAM DATA ────────────────────────────────────────────────────────────
 
-def get_weather(lat, lon):
+def fetch_conditions(lat, lon):
+    """
+    Soil and current weather for (lat, lon), plus per-upstream timings.
+    Anything that fails or misses its deadline falls back to the defaults.
+    """
+    cell = soil.cell_for(lat, lon)
     try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}&current_weather=true&hourly=relativehumidity_2m,precipitation"
-        )
-        response = requests.get(url)
-        data = response.json()
-        return {
-            "temperature": data.get("current_weather", {}).get("temperature", 30),
-            "humidity": data.get("hourly", {}).get("relativehumidity_2m", [50])[0],
-            "precipitation": data.get("hourly", {}).get("precipitation", [0])[0],
-            "windspeed": data.get("current_weather", {}).get("windspeed", 10)
-        }
+        cached_soil = soil.get_store().get(cell)
     except Exception as e:
-        print(f"[ERROR] Weather data fetch failed: {e}")
-        return {
-            "temperature": 30,
-            "humidity": 50,
-            "precipitation": 0,
-            "windspeed": 10
-        }
+        print(f"[ERROR] Soil tile cache read failed: {e}")
+        cached_soil = None
+
+    # Cache hits are answered here rather than queued on the fan-out pool
+    cached_weather = weather.cached_current_weather(lat, lon)
+
+    calls = {}
+    if cached_weather is None:
+        # raise_errors: an upstream failure must show up as "error", not a silent default
+        calls["weather"] = (weather.get_current_weather, (lat, lon, True), Config.FERTILIZER_WEATHER_DEADLINE,
+                            dict(weather.DEFAULT_CURRENT_WEATHER))
+    if cached_soil is None:
+        cell_lat, cell_lon = soil.cell_center(cell)
+        calls["soil_properties"] = (soil.fetch_surface_properties, (cell_lat, cell_lon),
+                                    Config.FERTILIZER_SOIL_DEADLINE, {})
+        calls["soil_carbon_stock"] = (soil.fetch_carbon_stock, (cell_lat, cell_lon),
+                                      Config.FERTILIZER_SOIL_DEADLINE, None)
+
+    results, timings = fanout.gather(calls)
+    if cached_weather is not None:
+        results["weather"] = cached_weather
+        timings["weather"] = {"status": "cached", "ms": 0.0}
+
+    if cached_soil is None:
+        raw_soil = {**results["soil_properties"], "soil_organic_carbon_stock": results["soil_carbon_stock"]}
+        # A tile missing a late or failed half would keep its defaults for good
+        if timings["soil_properties"]["status"] == timings["soil_carbon_stock"]["status"] == "ok":
+            try:
+                soil.save_cell(cell, raw_soil)
+            except Exception as e:
+                print(f"[ERROR] Soil tile cache write failed: {e}")
+    else:
+        raw_soil = cached_soil
+        timings["soil_properties"] = timings["soil_carbon_stock"] = {"status": "cached", "ms": 0.0}
+
+    return soil.with_defaults(raw_soil), results["weather"], timings
 
 # ─── ROUTE: FERTILIZER RECOMMENDATION ─────────────────────────────────────────
 
@@ -191,8 +155,9 @@ def fertilizer_route():
         if not all([crop, lat, lon]):
             return jsonify({"error": "Missing required fields: crop, lat, lon"}), 400
 
-        soil_data = get_soil_data(lat, lon)
-        weather_data = get_weather(lat, lon)
+        # Soil (two OpenEPI requests, skipped for a cached tile) and weather
+        # are independent: fetch them concurrently, each with its own deadline
+        soil_data, weather_data, upstream_timings = fetch_conditions(lat, lon)
 
         input_data = {
             "location": {
@@ -202,20 +167,26 @@ def fertilizer_route():
                 "country": country
             },
             "soil_data": soil_data,
-            "weather_data": weather_data,
-            "timestamp": datetime.datetime.now().isoformat()
+            "weather_data": weather_data
         }
 
-        recommendation = get_fertilizer_recommendation(input_data, crop, lang)
+        def finish(recommendation):
+            return {
+                "status": "success",
+                "crop": crop,
+                "location": input_data["location"],
+                "soil_data": soil_data,
+                "weather_data": weather_data,
+                "upstream_timings": upstream_timings,
+                "recommendation": recommendation.strip()
+            }
+
+        if sse.wants_stream():
+            payload = build_fertilizer_payload(input_data, crop, lang)
+            return sse.stream_completion(payload, finish, cache="fertilizer")
 
-        return jsonify({
-            "status": "success",
-            "crop": crop,
-            "location": input_data["location"],
-            "soil_data": soil_data,
-            "weather_data": weather_data,
-            "recommendation": recommendation
-        })
+        recommendation = get_fertilizer_recommendation(input_data, crop, lang)
+        return jsonify(finish(recommendation))
 
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
\ No newline at end of file
@@ -2,36 +2,34 @@
 
 from flask import Blueprint, request, jsonify
 import requests
-import os
+from concurrent.futures import ThreadPoolExecutor
 
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain_google_genai import ChatGoogleGenerativeAI  # Gemini LLM wrapper
-from langchain.schema import BaseRetriever
+from app.auth import admin_required
+from app.config import Config
+from app.services import llm_client, prompts, retrieval, sse
+from app.services.semantic_cache import SemanticCache
 
 govscheme_bp = Blueprint('govscheme', __name__)
 
 # ==== CONFIGURATION ====
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
 MODEL_ID = "llama-3.3-70b-versatile"
 
-# ==== VECTOR STORE ====
-EMBED_MODEL = "all-MiniLM-L6-v2"
-PERSIST_DIR = "./app/chromadb"
-COLLECTION = "agri_collection"
-
-embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-vectorstore = Chroma(
-    persist_directory=PERSIST_DIR,
-    embedding_function=embeddings
+# ==== SEMANTIC ANSWER CACHE ====
+# Paraphrases of an answered question ("PM Kisan eligibility" / "who can get
+# PM-KISAN money") reuse the stored answer without retrieval or Groq.
+answer_cache = SemanticCache(
+    "govscheme",
+    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+    maxsize=Config.SEMANTIC_CACHE_SIZE,
+    ttl=Config.SEMANTIC_CACHE_TTL
 )
-retriever: BaseRetriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 3})
 
 # ==== RAG Function ====
-def retrieve_context(query: str) -> str:
-    docs = retriever.get_relevant_documents(query)
+def retrieve_context(query: str, vector=None) -> str:
+    if vector is not None:
+        docs = retrieval.retrieve_by_vector(vector, k=3)
+    else:
+        docs = retrieval.retrieve(query, k=3)
     return "\n\n".join(doc.page_content for doc in docs)
 
 # ==== SYSTEM PROMPT ====
@@ -52,49 +50,173 @@ At the end of your response, include a Markdown-formatted table summarizing all
 Ensure the language is clear and avoids jargon.
 """
 
+def build_payload(user_query: str, lang: str, context: str) -> dict:
+    enhanced_prompt = (
+        f"{SYSTEM_PROMPT}\n\n---\n\nRelevant Documents:\n{context}\n\n---\n\n"
+        f"Please reply in {lang} language only.\n"
+        f"Now answer the user's question:\n{user_query}"
+    )
+    payload = {
+        "model": MODEL_ID,
+        "messages": [
+            {"role": "system", "content": enhanced_prompt},
+            {"role": "user", "content": user_query}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 1024
+    }
+    prompts.record_tokens("govscheme", payload)
+    return payload
+
 @govscheme_bp.route('/govscheme', methods=['POST'])
 def get_gov_scheme_info():
     try:
         data = request.get_json()
         user_query = data.get("query", "")
+        lang = data.get("lang", "English")
 
         if not user_query:
             return jsonify({"error": "Query not provided"}), 400
 
-        # Step 1: Retrieve documents using RAG
-        context = retrieve_context(user_query)
-
-        # Step 2: Inject context into the system prompt
-        enhanced_prompt = f"{SYSTEM_PROMPT}\n\n---\n\nRelevant Documents:\n{context}\n\n---\n\nNow answer the user's question:\n{user_query}"
+        # Step 1: Embed once; the vector serves both the cache and retrieval
+        query_vector = retrieval.embed_query(user_query)
+
+        if Config.SEMANTIC_CACHE_ENABLED:
+            hit = answer_cache.lookup(lang, query_vector)
+            if hit:
+                answer, matched_query, score = hit
+                body = {
+                    "query": user_query,
+                    "response": answer,
+                    "cache": {"matched_query": matched_query, "similarity": round(score, 3)}
+                }
+                if sse.wants_stream():
+                    return sse.stream_text(answer, body)
+                return jsonify(body)
+
+        # Step 2: Retrieve documents using RAG
+        context = retrieve_context(user_query, query_vector)
+
+        # Step 3: Inject context into the system prompt
+        payload = build_payload(user_query, lang, context)
+
+        def finish(answer):
+            if Config.SEMANTIC_CACHE_ENABLED:
+                answer_cache.add(lang, user_query, query_vector, answer)
+            return {
+                "query": user_query,
+                "response": answer
+            }
+
+        if sse.wants_stream():
+            return sse.stream_completion(payload, finish, cache="govscheme")
+
+        try:
+            answer = llm_client.chat_completion(payload, cache="govscheme")
+        except requests.exceptions.HTTPError as e:
+            return jsonify({"error": "Groq API error", "details": e.response.json()}), 500
+
+        return jsonify(finish(answer))
 
-        # Step 3: Send to Groq API
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": MODEL_ID,
-            "messages": [
-                {"role": "system", "content": enhanced_prompt},
-                {"role": "user", "content": user_query}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1024
-        }
-
-        response = requests.post(GROQ_URL, headers=headers, json=payload)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        if response.status_code != 200:
-            return jsonify({"error": "Groq API error", "details": response.json()}), 500
 
-        result = response.json()
-        answer = result['choices'][0]['message']['content']
+# ==== BATCH ====
+# Bounded pool shared by all batch requests in this worker for the Groq calls
+batch_executor = ThreadPoolExecutor(max_workers=Config.GOVSCHEME_BATCH_CONCURRENCY, thread_name_prefix="govscheme")
 
-        return jsonify({
-            "query": user_query,
-            "response": answer
-        })
+def answer_batch_item(user_query: str, lang: str, context: str, query_vector) -> dict:
+    try:
+        answer = llm_client.chat_completion(build_payload(user_query, lang, context), cache="govscheme")
+    except requests.exceptions.HTTPError as e:
+        return {"query": user_query, "lang": lang, "error": "Groq API error", "status": e.response.status_code}
+    except Exception as e:
+        return {"query": user_query, "lang": lang, "error": str(e)}
+    if Config.SEMANTIC_CACHE_ENABLED:
+        answer_cache.add(lang, user_query, query_vector, answer)
+    return {"query": user_query, "lang": lang, "response": answer}
+
+
+@govscheme_bp.route('/govscheme/batch', methods=['POST'])
+def get_gov_scheme_batch():
+    """
+    Answer many questions in one request, e.g. an FAQ refresh. Body:
+    {"queries": ["...", {"query": "...", "lang": "Hindi"}], "lang": "English"}
+    Results come back in request order; failures are reported per item.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("queries")
+    default_lang = data.get("lang", "English")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'queries' must be a non-empty list"}), 400
+    if len(items) > Config.GOVSCHEME_BATCH_MAX:
+        return jsonify({"error": f"At most {Config.GOVSCHEME_BATCH_MAX} queries per batch"}), 413
+
+    # Step 1: Normalise and de-duplicate; identical questions are answered once
+    requested, unique = [], {}
+    for item in items:
+        if isinstance(item, dict):
+            key = (str(item.get("query", "")).strip(), item.get("lang") or default_lang)
+        else:
+            key = (str(item).strip(), default_lang)
+        requested.append(key)
+        if key[0]:
+            unique.setdefault(key, None)
+    keys = list(unique)
 
+    try:
+        # Step 2: One embedding pass and one retrieval pass for every question
+        vectors = retrieval.embed_queries([query for query, _ in keys]) if keys else []
+
+        pending = []
+        for key, vector in zip(keys, vectors):
+            hit = answer_cache.lookup(key[1], vector) if Config.SEMANTIC_CACHE_ENABLED else None
+            if hit:
+                answer, matched_query, score = hit
+                unique[key] = {
+                    "query": key[0], "lang": key[1], "response": answer,
+                    "cache": {"matched_query": matched_query, "similarity": round(score, 3)}
+                }
+            else:
+                pending.append((key, vector))
+
+        contexts = retrieval.retrieve_by_vectors([vector for _, vector in pending], k=3) if pending else []
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+    # Step 3: Fan the Groq calls out with bounded concurrency
+    futures = {
+        key: batch_executor.submit(
+            answer_batch_item, key[0], key[1], "\n\n".join(doc.page_content for doc in docs), vector
+        )
+        for (key, vector), docs in zip(pending, contexts)
+    }
+    for key, future in futures.items():
+        unique[key] = future.result()
+
+    results = [
+        unique[key] if key[0] else {"query": key[0], "lang": key[1], "error": "Query not provided"}
+        for key in requested
+    ]
+    return jsonify({
+        "results": results,
+        "unique_queries": len(keys),
+        "generated": len(futures)
+    })
+
+
+@govscheme_bp.route('/govscheme/cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_answer_cache():
+    """Drop cached answers, e.g. after the scheme PDFs are re-ingested. Body: {"lang": "Hindi"} or {} for all."""
+    data = request.get_json(silent=True) or {}
+    lang = data.get("lang")
+    dropped = answer_cache.invalidate(lang)
+    return jsonify({"invalidated": dropped, "lang": lang or "all"})
+
+
+@govscheme_bp.route('/govscheme/cache/stats', methods=['GET'])
+@admin_required
+def answer_cache_stats():
+    return jsonify(answer_cache.stats())
@@ -0,0 +1,54 @@
+# health_bp.py
+
+from flask import Blueprint, request, jsonify, current_app
+
+from app.auth import admin_required
+from app.services import lazy, metrics, retrieval
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/health', methods=['GET'])
+def health():
+    """Liveness: answers as soon as the app is imported, before any model loads."""
+    return jsonify({"status": "ok"})
+
+
+@health_bp.route('/health/ready', methods=['GET'])
+def ready():
+    """
+    Readiness: 200 once the app can take traffic. Components load on first
+    use, so their state is reported but does not gate readiness; only a
+    startup warmup (WARMUP_ON_START) still in progress answers 503.
+    """
+    warmup = lazy.warmup_state()
+    is_ready = warmup["state"] != "running"
+    return jsonify({
+        "ready": is_ready,
+        "components": lazy.status(),
+        "warmup": warmup,
+        "startup": current_app.config.get("STARTUP_REPORT", {})
+    }), 200 if is_ready else 503
+
+
+@health_bp.route('/health/warmup', methods=['POST'])
+@admin_required
+def warmup():
+    """Load components now. Body may name a subset: {"components": ["embeddings"]}."""
+    data = request.get_json(silent=True) or {}
+    errors = lazy.warm(data.get("components"))
+    return jsonify({
+        "components": lazy.status(),
+        "errors": errors
+    }), 500 if errors else 200
+
+
+@health_bp.route('/health/memory', methods=['GET'])
+def memory():
+    return jsonify(retrieval.footprint())
+
+
+@health_bp.route('/health/metrics', methods=['GET'])
+def counters():
+    """Per-worker counters (cache hits/misses etc.), optionally filtered by ?prefix=."""
+    return jsonify(metrics.snapshot(request.args.get("prefix", "")))
@@ -1,12 +1,19 @@
 import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, request, jsonify
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 from typing import List
 
+from app.config import Config
+from app.services import metrics
+from app.services.cache import get_shared_store
+from app.services.lazy import LazyResource
+
 # Load environment variables
 load_dotenv()
 
@@ -28,20 +35,217 @@ class AgricultureData(BaseModel):
     weather: List[WeatherInfo] = Field(default=[])
     market_prices: List[MarketInfo] = Field(default=[])
 
-parser = PydanticOutputParser(pydantic_object=AgricultureData)
+# ✅ Step 2: LangChain + Groq chain (built on first use, so importing the
+# blueprint does not pull in langchain)
+def _build_chain():
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.output_parsers import PydanticOutputParser
+    from langchain_groq import ChatGroq
+
+    parser = PydanticOutputParser(pydantic_object=AgricultureData)
+    llm = ChatGroq(
+        temperature=0,
+        model_name="compound-beta",  # Enables web + code tools
+        api_key=os.getenv("GROQ_API_KEY")
+    )
+
+    # ✅ Step 3: LangChain Prompt Template
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an assistant that gives Indian farmers real-time weather info and market prices."),
+        ("user", "Give structured weather reports for {cities} and market prices for {crops} in India. Format output as per schema: {format_instructions}")
+    ]).partial(format_instructions=parser.get_format_instructions())
+    return prompt | llm | parser
+
+chain = LazyResource("market_chain", _build_chain)
+
+# ✅ Step 4: Stale-while-revalidate cache
+# Answers are decomposed into one entry per city (weather) and one per crop
+# (market prices) in the shared store, so any combination of cities and
+# crops is assembled from single-item entries. Entries younger than
+# MARKET_FRESH_TTL are served as is; older ones, up to MARKET_STALE_TTL, are
+# served immediately while a background call refreshes them. Only items with
+# no entry at all make the request wait for compound-beta.
+CACHE_NS = "market"
+refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="market-refresh")
+
+# Request counts per item in this worker, for the background refresher
+_demand = Counter()
+_display_names = {}
+_demand_lock = threading.Lock()
+_refresher_started = False
+
+def _normalize(name: str) -> str:
+    return " ".join((name or "").lower().split())
+
+
+def item_key(kind: str, name: str) -> str:
+    return f"{kind}:{_normalize(name)}"
+
+
+def _tokens(name: str) -> list[str]:
+    return re.findall(r"\w+", (name or "").lower())
+
+
+def _contains(row_name: str, requested: str) -> bool:
+    """Every word of the requested name appears, in order, among the row's words."""
+    row_tokens, wanted = _tokens(row_name), _tokens(requested)
+    if not wanted:
+        return False
+    position = 0
+    for token in row_tokens:
+        if position < len(wanted) and token == wanted[position]:
+            position += 1
+    return position == len(wanted)
+
+
+def match_rows(names: list[str], rows: list[dict], field: str) -> dict:
+    """
+    Rows per requested name. Each row goes to at most one name: first by
+    exact normalised name, then to the name whose words it contains ("rice"
+    takes "Rice (Basmati)", "Pune" takes "Pune, Maharashtra", but "pea" does
+    not take "Chickpea"), most specific name first. Rows still unclaimed go
+    to still unmatched names by position when their counts agree (the model
+    sometimes renames, e.g. "Poona" for "Pune").
+    """
+    matched = {name: [] for name in names}
+    claimed = set()
+
+    for name in names:
+        for i, row in enumerate(rows):
+            if i not in claimed and _normalize(row[field]) == _normalize(name):
+                matched[name].append(row)
+                claimed.add(i)
+
+    for name in sorted(names, key=lambda name: -len(_tokens(name))):
+        if matched[name]:
+            continue
+        for i, row in enumerate(rows):
+            if i not in claimed and _contains(row[field], name):
+                matched[name].append(row)
+                claimed.add(i)
+
+    leftover_names = [name for name in names if not matched[name]]
+    leftover_rows = [row for i, row in enumerate(rows) if i not in claimed]
+    if leftover_names and len(leftover_names) == len(leftover_rows):
+        for name, row in zip(leftover_names, leftover_rows):
+            matched[name].append(row)
+    return matched
+
 
-# ✅ Step 2: LangChain + Groq Model Setup
-llm = ChatGroq(
-    temperature=0,
-    model_name="compound-beta",  # Enables web + code tools
-    api_key=os.getenv("GROQ_API_KEY")
-)
+def fetch_items(cities: list[str], crops: list[str]):
+    """One compound-beta call for these cities and crops, stored as per-item entries."""
+    result: AgricultureData = chain.get().invoke({
+        "cities": ", ".join(cities),
+        "crops": ", ".join(crops)
+    })
+    metrics.incr("market.llm_calls")
+
+    now = time.time()
+    store = get_shared_store()
+    weather_rows = [row.dict() for row in result.weather]
+    price_rows = [row.dict() for row in result.market_prices]
+    for kind, names, rows, field in (("city", cities, weather_rows, "city"), ("crop", crops, price_rows, "crop")):
+        for name, matched in match_rows(names, rows, field).items():
+            # An item the model returned nothing for is cached empty, briefly,
+            # so requests for it do not each wait on a new call
+            ttl = Config.MARKET_STALE_TTL if matched else Config.MARKET_EMPTY_TTL
+            store.set(CACHE_NS, item_key(kind, name), {"rows": matched, "fetched_at": now}, ttl)
+
+
+def _refresh(cities: list[str], crops: list[str]):
+    """Background refresh, leased so one worker at a time refreshes the same items."""
+    lease = "lease:" + "|".join(sorted(item_key("city", c) for c in cities) + sorted(item_key("crop", c) for c in crops))
+    if not get_shared_store().add(CACHE_NS, lease, True, Config.MARKET_REFRESH_LEASE):
+        return
+    try:
+        fetch_items(cities, crops)
+        metrics.incr("market.background_refresh")
+    except Exception as e:
+        print(f"[ERROR] Market refresh failed: {e}")
+
+
+def _record_demand(cities: list[str], crops: list[str]):
+    with _demand_lock:
+        for kind, names in (("city", cities), ("crop", crops)):
+            for name in names:
+                key = item_key(kind, name)
+                _demand[key] += 1
+                _display_names[key] = name
+
+
+def _refresher_loop():
+    """Keep this worker's most requested items fresh before they go stale."""
+    while True:
+        time.sleep(Config.MARKET_REFRESH_INTERVAL)
+        with _demand_lock:
+            top = [key for key, _ in _demand.most_common(Config.MARKET_REFRESH_TOP)]
+            names = {key: _display_names[key] for key in top}
+            # Decay so yesterday's popular items eventually drop out
+            for key in list(_demand):
+                _demand[key] //= 2
+                if not _demand[key]:
+                    del _demand[key]
+                    _display_names.pop(key, None)
+
+        # Refresh what would otherwise expire before the next pass
+        horizon = time.time() - Config.MARKET_FRESH_TTL + Config.MARKET_REFRESH_INTERVAL
+        store = get_shared_store()
+        due = [key for key in top if (store.get(CACHE_NS, key) or {}).get("fetched_at", 0) < horizon]
+        cities = [names[key] for key in due if key.startswith("city:")]
+        crops = [names[key] for key in due if key.startswith("crop:")]
+        if cities or crops:
+            # The prompt needs at least one city and one crop; pad with the most popular
+            popular_city = next((names[key] for key in top if key.startswith("city:")), "New Delhi")
+            popular_crop = next((names[key] for key in top if key.startswith("crop:")), "rice")
+            _refresh(cities or [popular_city], crops or [popular_crop])
+
+
+def _ensure_refresher():
+    global _refresher_started
+    if _refresher_started or not Config.MARKET_REFRESH_ENABLED:
+        return
+    with _demand_lock:
+        if not _refresher_started:
+            threading.Thread(target=_refresher_loop, name="market-refresher", daemon=True).start()
+            _refresher_started = True
+
+
+def get_items(cities: list[str], crops: list[str]):
+    """Assembled AgricultureData dict plus cache info for this combination."""
+    store = get_shared_store()
+    keys = [("city", name) for name in cities] + [("crop", name) for name in crops]
+    entries = {key: store.get(CACHE_NS, item_key(*key)) for key in keys}
+
+    now = time.time()
+    missing = [key for key, entry in entries.items() if entry is None]
+    stale = [key for key, entry in entries.items() if entry and now - entry["fetched_at"] > Config.MARKET_FRESH_TTL]
+
+    if missing:
+        status = "miss"
+        # Fetch everything absent or stale in one call; fresh items stay cached
+        refetch = missing + stale
+        fetch_cities = [name for kind, name in refetch if kind == "city"] or cities[:1]
+        fetch_crops = [name for kind, name in refetch if kind == "crop"] or crops[:1]
+        fetch_items(fetch_cities, fetch_crops)
+        entries = {key: store.get(CACHE_NS, item_key(*key)) for key in keys}
+    elif stale:
+        status = "stale"
+        refresh_executor.submit(
+            _refresh,
+            [name for kind, name in stale if kind == "city"] or cities[:1],
+            [name for kind, name in stale if kind == "crop"] or crops[:1]
+        )
+    else:
+        status = "fresh"
+    metrics.incr(f"market.cache.{status}")
+
+    data = {"weather": [], "market_prices": []}
+    for (kind, _), entry in entries.items():
+        if entry:
+            data["weather" if kind == "city" else "market_prices"].extend(entry["rows"])
+    ages = [now - entry["fetched_at"] for entry in entries.values() if entry]
+    return data, {"status": status, "age_seconds": round(max(ages)) if ages else None}
 
-# ✅ Step 3: LangChain Prompt Template
-prompt = ChatPromptTemplate.from_messages([
-    ("system", "You are an assistant that gives Indian farmers real-time weather info and market prices."),
-    ("user", "Give structured weather reports for {cities} and market prices for {crops} in India. Format output as per schema: {format_instructions}")
-])
 
 @weather_market_bp.route("/api/weather-market", methods=["GET"])
 def weather_market():
@@ -51,18 +255,14 @@ def weather_market():
         cities = [city.strip() for city in cities if city.strip()]
         crops = [crop.strip() for crop in crops if crop.strip()]
 
-        format_instructions = parser.get_format_instructions()
-
-        chain = prompt | llm | parser
-        result: AgricultureData = chain.invoke({
-            "cities": ", ".join(cities),
-            "crops": ", ".join(crops),
-            "format_instructions": format_instructions
-        })
+        _record_demand(cities, crops)
+        _ensure_refresher()
+        data, cache_info = get_items(cities, crops)
 
         return jsonify({
             "success": True,
-            "data": result.dict()
+            "data": data,
+            "cache": cache_info
         })
 
     except Exception as e:
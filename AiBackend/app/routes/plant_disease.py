@@ -1,17 +1,31 @@
-from flask import Blueprint, request, jsonify
-import os
+from flask import Blueprint, request, jsonify, url_for
 import base64
 import requests
 from dotenv import load_dotenv
 from flask_cors import CORS
-from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 import json
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.auth import admin_required
+from app.config import Config
+from app.services import images, llm_client, metrics, prompts, sse, structured
+from app.services.cache import get_shared_store
 
 load_dotenv()
 
 plant_disease_bp = Blueprint('plant_disease_bp', __name__)
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+# Full responses (diagnosis + treatment) keyed by perceptual hash and language
+diagnosis_cache = images.PerceptualCache(
+    "plant_disease",
+    max_distance=Config.PHASH_MAX_DISTANCE,
+    maxsize=Config.PHASH_CACHE_SIZE,
+    ttl=Config.PHASH_CACHE_TTL,
+)
 
 # Define the Pydantic model with `treatment_required`
 class PlantDiagnosis(BaseModel):
@@ -23,7 +37,103 @@ class PlantDiagnosis(BaseModel):
     disease_symptoms: list[str] = Field(..., description="List of symptoms in simple sentences")
     treatment_required: bool = Field(..., description="True if treatment is necessary, else False")
 
-parser = PydanticOutputParser(pydantic_object=PlantDiagnosis)
+# ==== TREATMENT CACHE ====
+# Treatment procedures depend on the disease, not on the photo, so they are
+# stored per normalised (plant, disease, type, language) in the shared store:
+# during an outbreak most reports of the same disease need only the vision call.
+TREATMENT_NS = "plant_disease:treatment"
+TREATMENT_PROMPT_VERSION = "treatment-v1"
+
+def _normalize(value: str) -> str:
+    # Punctuation only; \w would also strip Indic vowel signs
+    value = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in value.lower())
+    return " ".join(value.split())
+
+
+def treatment_key(plant: str, disease: str, type_of_disease: str, lang: str) -> str:
+    parts = (TREATMENT_PROMPT_VERSION, plant, disease, type_of_disease, lang)
+    return "|".join(_normalize(part) for part in parts)
+
+
+def generate_treatment(plant: str, disease: str, type_of_disease: str, symptoms: list[str], lang: str) -> str:
+    treatment_prompt = (
+        f"You are an Indian agricultural specialist. The following disease has been identified in {plant}:\n"
+        f"Disease: {disease}\n"
+        f"Type: {type_of_disease}\n"
+        f"Symptoms: {', '.join(symptoms)}\n\n"
+        f"Provide systematic treatment procedures in India, in {lang}, categorized into:\n"
+        "- Organic Treatment\n"
+        "- Chemical Treatment\n\n"
+        "Be specific, mention commonly used names of treatments, and relevant practices for Indian farmers."
+    )
+
+    treatment_payload = {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [
+            {"role": "system", "content": f"You are an expert in Indian agricultural treatment practices. Respond in {lang}."},
+            {"role": "user", "content": treatment_prompt}
+        ],
+        "temperature": 0.4
+    }
+
+    return llm_client.chat_completion(treatment_payload)
+
+
+def cached_treatment(plant: str, disease: str, type_of_disease: str, lang: str):
+    try:
+        treatment = get_shared_store().get(TREATMENT_NS, treatment_key(plant, disease, type_of_disease, lang))
+    except Exception as e:
+        print(f"[ERROR] Treatment cache read failed: {e}")
+        treatment = None
+    metrics.incr(f"treatment_cache.{'hit' if treatment is not None else 'miss'}")
+    return treatment
+
+
+def get_treatment(plant: str, disease: str, type_of_disease: str, symptoms: list[str], lang: str) -> str:
+    """Stored treatment for this disease and language, generating it on a miss."""
+    treatment = cached_treatment(plant, disease, type_of_disease, lang)
+    if treatment is not None:
+        return treatment
+
+    treatment = generate_treatment(plant, disease, type_of_disease, symptoms, lang)
+    key = treatment_key(plant, disease, type_of_disease, lang)
+    try:
+        get_shared_store().set(TREATMENT_NS, key, treatment, llm_client.cache_ttl("plant_treatment"))
+    except Exception as e:
+        print(f"[ERROR] Treatment cache write failed: {e}")
+    return treatment
+
+
+# ==== DEFERRED TREATMENT ====
+# With defer_treatment=true the diagnosis is returned as soon as the vision
+# call finishes, with a ticket; the treatment is generated on this pool and
+# published in the shared store, where any worker can serve the follow-up.
+TICKET_NS = "plant_disease:ticket"
+treatment_executor = ThreadPoolExecutor(max_workers=Config.TREATMENT_WORKERS, thread_name_prefix="treatment")
+
+def save_ticket(ticket: str, state: dict):
+    get_shared_store().set(TICKET_NS, ticket, state, Config.TREATMENT_TICKET_TTL)
+
+
+def complete_treatment(ticket: str, diagnosis: dict, lang: str, image_hash: int):
+    try:
+        treatment = get_treatment(
+            diagnosis["plant"],
+            diagnosis["disease"],
+            diagnosis["type_of_disease"],
+            diagnosis["disease_symptoms"],
+            lang
+        )
+    except Exception as e:
+        print(f"[ERROR] Deferred treatment {ticket} failed: {e}")
+        save_ticket(ticket, {"status": "failed", "error": "Treatment generation failed. Please try again."})
+        return
+    save_ticket(ticket, {"status": "done", "treatment_procedure": treatment})
+    diagnosis_cache.set(image_hash, lang.strip().lower(), {**diagnosis, "treatment_procedure": treatment})
+
+
+def wants_deferred_treatment() -> bool:
+    return request.values.get("defer_treatment", "").lower() in ("1", "true", "yes")
 
 # Enable CORS for the blueprint
 @plant_disease_bp.after_request
@@ -40,19 +150,35 @@ def detect_plant_disease():
 
     try:
         image_file = request.files['image']
-        image_bytes = image_file.read()
-        encoded_image = base64.b64encode(image_bytes).decode('utf-8')
         lang = request.form.get('lang', 'English')
 
         print('Chosen langugae' + lang)
 
+        # Orient, downscale and re-encode before anything else; the vision
+        # model does not use detail beyond VISION_MAX_SIDE
+        try:
+            jpeg_bytes, image = images.prepare_image(
+                image_file.read(), Config.VISION_MAX_SIDE, Config.VISION_JPEG_QUALITY
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # The same (or a near-identical) photo was already diagnosed
+        image_hash = images.dhash(image)
+        cached = diagnosis_cache.get(image_hash, lang.strip().lower())
+        if cached is not None:
+            return jsonify(cached), 200
+
+        encoded_image = base64.b64encode(jpeg_bytes).decode('utf-8')
+        del jpeg_bytes, image
+
         # Primary prompt to detect disease
         prompt = (
             f"You are an agricultural expert. Analyze the uploaded image of a plant or leaf and extract structured data. Respond in {lang}.\n\n"
-            f"{parser.get_format_instructions()}\n\n"
+            f"{prompts.format_instructions(PlantDiagnosis)}\n\n"
             "The image may include signs of disease or deficiencies. If a tomato fruit is visible, analyze its health as well. "
             "Include whether treatment is required (true/false). Respond only in JSON format matching the schema."
-            "Please give reply in {lang} language only"
+            f"Please give reply in {lang} language only"
         )
 
         payload = {
@@ -65,49 +191,42 @@ def detect_plant_disease():
             ],
             "temperature": 0.4
         }
+        prompts.record_tokens("plant_disease", payload)
 
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        response = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
-
-        structured_data = parser.parse(content)
+        structured_data = structured.complete(payload, PlantDiagnosis, cache="plant_disease")
         output_data = structured_data.dict()
 
-        # If treatment is required, get treatment suggestions
-        if structured_data.treatment_required:
-            treatment_prompt = (
-                f"You are an Indian agricultural specialist. The following disease has been identified in {structured_data.plant}:\n"
-                f"Disease: {structured_data.disease}\n"
-                f"Type: {structured_data.type_of_disease}\n"
-                f"Symptoms: {', '.join(structured_data.disease_symptoms)}\n\n"
-                f"Provide systematic treatment procedures in India, in {lang}, categorized into:\n"
-                "- Organic Treatment\n"
-                "- Chemical Treatment\n\n"
-                "Be specific, mention commonly used names of treatments, and relevant practices for Indian farmers."
+        # Two-phase response: hand back the diagnosis now and the treatment
+        # via GET /plant-disease/treatment/<ticket>, unless it is already stored
+        if structured_data.treatment_required and wants_deferred_treatment():
+            treatment_content = cached_treatment(
+                structured_data.plant, structured_data.disease, structured_data.type_of_disease, lang
             )
+            if treatment_content is None:
+                ticket = uuid.uuid4().hex
+                save_ticket(ticket, {"status": "pending"})
+                treatment_executor.submit(complete_treatment, ticket, output_data, lang, image_hash)
+                return jsonify({
+                    **output_data,
+                    "treatment_status": "pending",
+                    "treatment_ticket": ticket,
+                    "treatment_url": url_for("plant_disease_bp.get_deferred_treatment", ticket=ticket)
+                }), 200
+            output_data["treatment_procedure"] = treatment_content
 
-            treatment_payload = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [
-                    {"role": "system", "content": f"You are an expert in Indian agricultural treatment practices. Respond in {lang}."},
-                    {"role": "user", "content": treatment_prompt}
-                ],
-                "temperature": 0.4
-            }
-
-            treatment_response = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=treatment_payload)
-            treatment_response.raise_for_status()
-            treatment_result = treatment_response.json()
-            treatment_content = treatment_result["choices"][0]["message"]["content"]
+        # If treatment is required, get treatment suggestions
+        elif structured_data.treatment_required:
+            treatment_content = get_treatment(
+                structured_data.plant,
+                structured_data.disease,
+                structured_data.type_of_disease,
+                structured_data.disease_symptoms,
+                lang
+            )
 
             output_data["treatment_procedure"] = treatment_content
 
+        diagnosis_cache.set(image_hash, lang.strip().lower(), output_data)
         return jsonify(output_data), 200
 
     except requests.exceptions.RequestException as e:
@@ -115,4 +234,78 @@ def detect_plant_disease():
         return jsonify({"error": "Error communicating with Groq API. Please try again later."}), 500
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
-        return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
\ No newline at end of file
+        return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
+
+
+@plant_disease_bp.route("/plant-disease/treatment/<ticket>", methods=["GET"])
+def get_deferred_treatment(ticket):
+    """
+    Follow-up for a deferred treatment: 202 while it is being generated,
+    200 with `treatment_procedure` once done. With ?stream=true the
+    connection is held open and the result sent as a single done event.
+    """
+    state = get_shared_store().get(TICKET_NS, ticket)
+    if state is None:
+        return jsonify({"error": "Unknown or expired treatment ticket."}), 404
+
+    if sse.wants_stream():
+        def events():
+            current = state
+            deadline = time.monotonic() + Config.TREATMENT_STREAM_WAIT
+            while current is not None and current["status"] == "pending" and time.monotonic() < deadline:
+                yield sse.event({"stage": "treatment"}, "status")
+                time.sleep(1)
+                current = get_shared_store().get(TICKET_NS, ticket)
+            if current is not None and current["status"] == "done":
+                yield sse.event(current, "done")
+            else:
+                yield sse.event({"error": (current or {}).get("error", "Treatment is not ready yet.")}, "error")
+        return sse.sse_response(events())
+
+    if state["status"] == "pending":
+        return jsonify(state), 202
+    if state["status"] == "failed":
+        return jsonify(state), 500
+    return jsonify(state), 200
+
+
+@plant_disease_bp.route("/plant-disease/treatments/warm", methods=["POST"])
+@admin_required
+def warm_treatments():
+    """
+    Pre-generate treatments ahead of an expected outbreak. Body:
+    {"diseases": [{"plant": "Tomato", "disease": "Early blight", "type_of_disease": "fungus",
+                   "disease_symptoms": [...]}], "languages": ["English", "Hindi"]}
+    """
+    data = request.get_json(silent=True) or {}
+    diseases = data.get("diseases") or []
+    languages = data.get("languages") or ["English"]
+    if not isinstance(diseases, list) or not all(isinstance(d, dict) for d in diseases):
+        return jsonify({"error": "'diseases' must be a list of objects."}), 400
+
+    jobs = []
+    for entry in diseases:
+        if not all(entry.get(field) for field in ("plant", "disease", "type_of_disease")):
+            return jsonify({"error": "Each disease needs 'plant', 'disease' and 'type_of_disease'."}), 400
+        for lang in languages:
+            jobs.append((entry["plant"], entry["disease"], entry["type_of_disease"],
+                         entry.get("disease_symptoms") or [], lang))
+
+    missing = [job for job in jobs if cached_treatment(*job[:3], job[4]) is None]
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = {pool.submit(get_treatment, *job): job for job in missing}
+        for future, job in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[ERROR] Treatment warm-up failed for {job[:3]} ({job[4]}): {e}")
+                failed.append({"plant": job[0], "disease": job[1], "lang": job[4]})
+
+    return jsonify({
+        "requested": len(jobs),
+        "already_cached": len(jobs) - len(missing),
+        "generated": len(missing) - len(failed),
+        "failed": failed
+    })
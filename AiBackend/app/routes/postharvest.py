@@ -1,40 +1,13 @@
 from flask import Blueprint, request, jsonify
-import os
 import requests
 from dotenv import load_dotenv
-from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
+from app.services import prompts, structured, weather
+
 load_dotenv()
 
 postharvest_bp = Blueprint('postharvest_bp', __name__)
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-# Updated Weather Forecast function using daily data
-def get_weather_forecast(lat, lon):
-    try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}"
-            f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,wind_speed_10m_max,"
-            f"relative_humidity_2m_max,relative_humidity_2m_min"
-            f"&forecast_days=7&timezone=auto"
-        )
-        response = requests.get(url)
-        data = response.json()
-
-        return {
-            "dates": data.get("daily", {}).get("time", []),
-            "temp_max": data.get("daily", {}).get("temperature_2m_max", []),
-            "temp_min": data.get("daily", {}).get("temperature_2m_min", []),
-            "humidity_max": data.get("daily", {}).get("relative_humidity_2m_max", []),
-            "humidity_min": data.get("daily", {}).get("relative_humidity_2m_min", []),
-            "precipitation": data.get("daily", {}).get("precipitation_sum", []),
-            "wind_speed_max": data.get("daily", {}).get("wind_speed_10m_max", [])
-        }
-    except Exception as e:
-        print(f"[ERROR] Forecast fetch failed: {e}")
-        return {}
 
 # Pydantic models
 class PlanItem(BaseModel):
@@ -57,8 +30,6 @@ class PostHarvestResponse(BaseModel):
     plan: list[PlanItem]
     conclusion_text: str
 
-parser = PydanticOutputParser(pydantic_object=PostHarvestResponse)
-
 @postharvest_bp.route("/postharvest", methods=["POST"])
 def postharvest_instructions():
     data = request.json
@@ -75,7 +46,7 @@ def postharvest_instructions():
         return jsonify({"error": "Missing 'latitude' or 'longitude' in request for weather data."}), 400
 
     # Use forecast data
-    weather_info = get_weather_forecast(lat, lon)
+    weather_info = weather.get_daily_forecast(lat, lon)
 
     # Build prompt with language instruction
     system_prompt = (
@@ -84,13 +55,13 @@ def postharvest_instructions():
         "Given the crop, harvest date, region, and 7-day weather forecast, provide practical and region-specific post-harvest instructions. "
         "Consider how temperature, humidity, precipitation, and windspeed affect drying, grading, storage, packaging, and transport decisions. "
         "Respond strictly in JSON format following the schema: {}"
-    ).format(parser.get_format_instructions())
+    ).format(prompts.format_instructions(PostHarvestResponse))
 
     user_prompt = (
         f"Crop: {crop}\n"
         f"Harvest Date: {harvest_date}\n"
         f"Region: {region}\n"
-        f"Weather Forecast: {weather_info}\n"
+        f"{prompts.weather_context(weather_info)}\n"
         "Provide beginning_text, weather, a list of plan items (action, date, duration), and conclusion_text."
     )
 
@@ -102,22 +73,10 @@ def postharvest_instructions():
         ],
         "temperature": 0.5
     }
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    prompts.record_tokens("postharvest", payload)
 
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        reply_text = response.json()["choices"][0]["message"]["content"]
-
-        result = parser.parse(reply_text)
+        result = structured.complete(payload, PostHarvestResponse, cache="postharvest")
         return jsonify(result.dict()), 200
 
     except requests.exceptions.RequestException as e:
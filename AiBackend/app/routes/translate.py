@@ -1,42 +1,30 @@
 # translate_bp.py
 
 from flask import Blueprint, request, jsonify
+import hashlib
 import os
-import fitz  # PyMuPDF
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 from dotenv import load_dotenv
 
-# RAG imports
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.schema import Document
+from app.config import Config
+from app.services import llm_client, metrics, pdf, retrieval, sse
+from app.services.cache import get_shared_store
 
 load_dotenv()
 
 translate_bp = Blueprint('translate_bp', __name__)
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
 MODEL_ID = "llama-3.3-70b-versatile"
 
-# ==== VECTOR STORE SETUP ====
-EMBED_MODEL = "all-MiniLM-L6-v2"
-PERSIST_DIR   = "./app/chromadb"
-embeddings    = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-vectorstore   = Chroma(
-    persist_directory=PERSIST_DIR,
-    embedding_function=embeddings
-)
-retriever     = vectorstore.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 3}
-)
+# Bounded pool shared by all requests in this worker for chunk explanations
+chunk_executor = ThreadPoolExecutor(max_workers=Config.TRANSLATE_WORKERS, thread_name_prefix="translate")
 
 def retrieve_references(query: str) -> list[dict]:
     """
     Fetch top-K docs most similar to `query` and return
     a snippet + (optional) metadata as references.
     """
-    docs = retriever.get_relevant_documents(query)
+    docs = retrieval.retrieve(query, k=3)
     refs = []
     for doc in docs:
         refs.append({
@@ -46,8 +34,208 @@ def retrieve_references(query: str) -> list[dict]:
     return refs
 
 
+def system_prompt_for(target_language: str) -> str:
+    return (
+        "You are an expert in explaining agricultural and government documents to rural farmers. "
+        "Instead of directly translating, summarize and explain the content in very simple and clear terms "
+        f"in the target language ({target_language}). Use a farmer-friendly tone. Preserve any important data or rules, "
+        "but avoid complex language. If needed, use bullet points or sections for better clarity."
+    )
+
+
+def completion_payload(system_prompt: str, prompt: str, **params) -> dict:
+    return {
+        "model": MODEL_ID,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user",   "content": prompt}
+        ],
+        "temperature": 0.4,
+        **params
+    }
+
+
+# ==== CONTENT-ADDRESSED CACHE ====
+# Whole documents are keyed by the SHA-256 of the uploaded bytes plus the
+# target language; chunks by the hash of their text. Chunk boundaries are
+# content-defined, so a re-issued circular only pays for the chunks around
+# the pages that changed. Entries live in the shared SQLite store. Bump the
+# version when the chunk prompt changes.
+CHUNK_PROMPT_VERSION = "chunk-v1"
+
+def content_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def cache_get(kind: str, key: str):
+    try:
+        value = get_shared_store().get(f"translate:{kind}", key)
+    except Exception as e:
+        print(f"[ERROR] Translate cache read failed: {e}")
+        value = None
+    metrics.incr(f"translate_cache.{kind}.{'hit' if value is not None else 'miss'}")
+    return value
+
+
+def cache_set(kind: str, key: str, value):
+    try:
+        get_shared_store().set(f"translate:{kind}", key, value, llm_client.cache_ttl("translate"))
+    except Exception as e:
+        print(f"[ERROR] Translate cache write failed: {e}")
+
+
+def cached_references(query: str) -> list[dict]:
+    key = content_key(query)
+    refs = cache_get("references", key)
+    if refs is None:
+        refs = retrieve_references(query)
+        cache_set("references", key, refs)
+    return refs
+
+
+# ==== CHUNKING ====
+
+def apply_budget(page_texts, total_pages: int) -> tuple[list[str], bool]:
+    """
+    Take leading pages from the `page_texts` iterator until the page or
+    input-token budget is spent; later pages are never extracted.
+    """
+    kept, used = [], 0
+    for page in islice(page_texts, Config.TRANSLATE_MAX_PAGES):
+        tokens = llm_client.estimate_tokens(page)
+        if kept and used + tokens > Config.TRANSLATE_MAX_INPUT_TOKENS:
+            break
+        kept.append(page)
+        used += tokens
+    return kept, len(kept) < total_pages
+
+
+def _page_pieces(page: str, limit_chars: int):
+    """The page itself, or paragraph-sized slices of it when it exceeds the chunk size."""
+    if len(page) <= limit_chars:
+        yield page
+        return
+    for paragraph in page.split("\n\n"):
+        for start in range(0, len(paragraph), limit_chars):
+            yield paragraph[start:start + limit_chars]
+
+
+def _cuts_after(piece: str, target_chars: int) -> bool:
+    """
+    Content-defined chunk boundary: cut after `piece` when its hash falls
+    below its share of the target size. The decision depends only on the
+    piece itself, so on average a chunk spans `target_chars`.
+    """
+    value = int(hashlib.sha256(piece.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return value < len(piece) / target_chars
+
+
+def split_into_chunks(pages: list[str]) -> list[dict]:
+    """
+    Group consecutive pages into chunks of at most TRANSLATE_CHUNK_TOKENS.
+    Boundaries are content-defined rather than packed by size, so inserting,
+    deleting or editing a page changes only the chunks around it and the
+    rest keep their cached explanations.
+    """
+    limit_chars = Config.TRANSLATE_CHUNK_TOKENS * 4
+    # Average chunk size; the gap to the limit keeps forced (shifting) cuts rare
+    target_chars = limit_chars * 3 // 4
+    chunks, parts, size = [], [], 0
+    first_page = last_page = 1
+
+    def close():
+        text = "\n".join(parts).strip()
+        if text:
+            chunks.append({"pages": (first_page, last_page), "text": text})
+
+    for number, page in enumerate(pages, start=1):
+        for piece in _page_pieces(page, limit_chars):
+            # Forced cut only when the piece would overflow the chunk
+            if parts and size + len(piece) > limit_chars:
+                close()
+                parts, size = [], 0
+            if not parts:
+                first_page = number
+            parts.append(piece)
+            size += len(piece)
+            last_page = number
+            if _cuts_after(piece, target_chars):
+                close()
+                parts, size = [], 0
+    close()
+    return chunks
+
+
+def explain_chunk(chunk: dict, target_language: str) -> str:
+    """
+    Explain one chunk, reusing a stored explanation of identical text. The
+    prompt carries no position so a page keeps its cache entry when a
+    re-issued document shifts it.
+    """
+    key = content_key(CHUNK_PROMPT_VERSION, target_language.strip().lower(), chunk["text"])
+    cached = cache_get("chunk", key)
+    if cached is not None:
+        return cached
+
+    prompt = (
+        "This is one part of a longer document. "
+        f"Explain this part in {target_language}. Keep every number, date, amount, deadline and eligibility rule. "
+        "Do not add an introduction or conclusion; other parts are explained separately.\n\n"
+        f"{chunk['text']}"
+    )
+    payload = completion_payload(system_prompt_for(target_language), prompt, max_tokens=1024)
+    explanation = llm_client.chat_completion(payload)
+    cache_set("chunk", key, explanation)
+    return explanation
+
+
+def merge_payload(partials: list[str], target_language: str) -> dict:
+    sections = "\n\n".join(f"### Part {i}\n{text}" for i, text in enumerate(partials, start=1))
+    prompt = (
+        f"Below are explanations, in {target_language}, of consecutive parts of one document. "
+        f"Merge them into a single clear explanation in {target_language} for farmers: remove repetition, "
+        "keep every important number, date and rule, and organise it with short sections or bullet points.\n\n"
+        f"{sections}"
+    )
+    return completion_payload(system_prompt_for(target_language), prompt)
+
+
+def stream_chunked(chunks: list[dict], futures: list, payload, target_language: str, finish):
+    """
+    SSE events for a translation: a status event per explained chunk (in
+    completion order), then the merge (or single-pass `payload`) as tokens.
+    """
+    if futures:
+        yield sse.event({"stage": "explaining", "total": len(futures)}, "status")
+        index = {future: i for i, future in enumerate(futures)}
+        partials = [None] * len(futures)
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                partials[index[future]] = future.result()
+                yield sse.event({
+                    "stage": "chunk",
+                    "pages": chunks[index[future]]["pages"],
+                    "done": done,
+                    "total": len(futures)
+                }, "status")
+        except Exception as e:
+            print(f"[ERROR] Chunk explanation failed: {e}")
+            yield sse.event({"error": str(e)}, "error")
+            return
+        payload = merge_payload(partials, target_language)
+        yield sse.event({"stage": "merging"}, "status")
+    yield from sse.completion_events(payload, finish, cache="translate")
+
+
 @translate_bp.route("/translate", methods=["POST"])
 def translate_document():
+    # Reject oversized bodies from the Content-Length header, and cap the
+    # multipart parser in case the header is missing or wrong
+    max_bytes = Config.TRANSLATE_MAX_UPLOAD_MB * 2**20
+    request.max_content_length = max_bytes + 64 * 1024  # allowance for form fields
+    if request.content_length and request.content_length > request.max_content_length:
+        return jsonify({"error": f"File exceeds the {Config.TRANSLATE_MAX_UPLOAD_MB} MB upload limit."}), 413
+
     if 'file' not in request.files:
         return jsonify({"error": "No PDF file provided."}), 400
 
@@ -56,51 +244,72 @@ def translate_document():
     if not target_language:
         return jsonify({"error": "No target language specified."}), 400
 
+    pdf_path = None
     try:
-        # 1) Extract text from PDF
-        text = ""
-        with fitz.open(stream=pdf_file.read(), filetype="pdf") as doc:
-            for page in doc:
-                text += page.get_text()
-        if not text.strip():
+        # 1) Spool the upload to disk, hashing it on the way; an identical
+        #    document already explained in this language is returned as is
+        pdf_path, file_digest = pdf.spool_upload(pdf_file, max_bytes)
+        document_key = content_key(file_digest, target_language.strip().lower())
+        cached = cache_get("document", document_key)
+        if cached is not None:
+            if sse.wants_stream():
+                return sse.stream_text(cached["translated_document"], cached)
+            return jsonify(cached), 200
+
+        # Extract text page by page
+        with pdf.open_pdf(pdf_path, Config.TRANSLATE_MAX_UPLOAD_PAGES) as doc:
+            pages, truncated = apply_budget(pdf.iter_page_text(doc), doc.page_count)
+        if not "".join(pages).strip():
             return jsonify({"error": "PDF appears empty or unreadable."}), 400
 
+        text = "".join(pages)
+
         # 2) Retrieve “related” docs for references
         #    Here we use the first 500 characters of the doc as a proxy query:
-        refs = retrieve_references(text[:500])
-
-        # 3) Build your Groq prompt (unchanged core logic)
-        system_prompt = (
-            "You are an expert in explaining agricultural and government documents to rural farmers. "
-            "Instead of directly translating, summarize and explain the content in very simple and clear terms "
-            f"in the target language ({target_language}). Use a farmer-friendly tone. Preserve any important data or rules, "
-            "but avoid complex language. If needed, use bullet points or sections for better clarity."
-        )
-        prompt = f"Explain the following document in {target_language}:\n\n{text.strip()}"
-
-        payload = {
-            "model": MODEL_ID,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user",   "content": prompt}
-            ],
-            "temperature": 0.4
-        }
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        # 4) Call Groq
-        response = requests.post(GROQ_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        translated_text = response.json()["choices"][0]["message"]["content"]
+        refs = cached_references(text[:500])
+
+        # 3) Short documents go out in one prompt; long ones are explained
+        #    chunk by chunk in parallel (map) and the parts merged (reduce)
+        chunks, futures = [], []
+        if llm_client.estimate_tokens(text) <= Config.TRANSLATE_SINGLE_PASS_TOKENS:
+            prompt = f"Explain the following document in {target_language}:\n\n{text.strip()}"
+            payload = completion_payload(system_prompt_for(target_language), prompt)
+        else:
+            chunks = split_into_chunks(pages)
+            futures = [
+                chunk_executor.submit(explain_chunk, chunk, target_language)
+                for chunk in chunks
+            ]
+            payload = None
+
+        def finish(translated_text):
+            body = {
+                "translated_document": translated_text,
+                "references": refs,
+                "pages_processed": len(pages),
+                "chunks": len(chunks) or 1,
+                "truncated": truncated
+            }
+            cache_set("document", document_key, body)
+            return body
+
+        # 4) Call Groq, streaming the explanation if the client asked for it.
+        #    A stream starts right away and reports each chunk as it is
+        #    explained, before relaying the merge.
+        if sse.wants_stream():
+            return sse.sse_response(stream_chunked(chunks, futures, payload, target_language, finish))
+
+        if payload is None:
+            payload = merge_payload([future.result() for future in futures], target_language)
+        translated_text = llm_client.chat_completion(payload, cache="translate")
 
         # 5) Return both translated doc and references
-        return jsonify({
-            "translated_document": translated_text,
-            "references": refs
-        }), 200
+        return jsonify(finish(translated_text)), 200
 
+    except pdf.UploadRejected as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if pdf_path:
+            os.remove(pdf_path)
@@ -1,39 +1,16 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
-import os
 import requests
 from dotenv import load_dotenv
-from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
+from app.services import prompts, structured, weather
+
 load_dotenv()
 
 water_management_bp = Blueprint("water_management_bp", __name__)
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-# Step 1: Weather Forecast API (Reusing Open-Meteo)
-def get_weather_forecast(lat, lon):
-    try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}"
-            f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,evapotranspiration"
-            f"&forecast_days=7&timezone=auto"
-        )
-        response = requests.get(url)
-        data = response.json()
-        return {
-            "dates": data.get("daily", {}).get("time", []),
-            "temp_max": data.get("daily", {}).get("temperature_2m_max", []),
-            "temp_min": data.get("daily", {}).get("temperature_2m_min", []),
-            "precipitation": data.get("daily", {}).get("precipitation_sum", []),
-            "evapotranspiration": data.get("daily", {}).get("evapotranspiration", []),
-        }
-    except Exception as e:
-        print(f"[ERROR] Weather fetch failed: {e}")
-        return {}
 
-# Step 2: Pydantic Models
+# Step 1: Pydantic Models
 class IrrigationEvent(BaseModel):
     date: str = Field(description="Date of irrigation (YYYY-MM-DD)")
     water_mm: int = Field(description="Water to apply in millimeters")
@@ -54,9 +31,7 @@ class WaterManagementPlan(BaseModel):
     water_saving_tips: list[WaterSavingTip] = Field(description="List of water-saving techniques")
     explanation: str = Field(description="Farmer-friendly explanation of the plan")
 
-parser = PydanticOutputParser(pydantic_object=WaterManagementPlan)
-
-# Step 3: Route
+# Step 2: Route
 @water_management_bp.route("/water_management", methods=["POST"])
 def suggest_water_management():
     data = request.json
@@ -71,7 +46,7 @@ def suggest_water_management():
     if not all([lat, lon, crop, field_size_acres]):
         return jsonify({"error": "Missing latitude, longitude, crop, or field_size_acres."}), 400
 
-    weather_info = get_weather_forecast(lat, lon)
+    weather_info = weather.get_daily_forecast(lat, lon, weather.IRRIGATION_FIELDS)
 
     # Prompt to LLM
     system_prompt = (
@@ -91,7 +66,7 @@ def suggest_water_management():
         "Use crop water needs (e.g., wheat: 450 mm/season, rice: 1200 mm/season) and soil properties "
         "(e.g., loamy: 100 mm/m water-holding capacity) to estimate needs. Adjust for weather (precipitation, evapotranspiration).\n"
         "Respond only in JSON format according to the schema: "
-        f"{parser.get_format_instructions()}"
+        f"{prompts.format_instructions(WaterManagementPlan)}"
     )
 
     user_prompt = (
@@ -99,7 +74,7 @@ def suggest_water_management():
         f"Soil Type: {soil_type}\n"
         f"Field Size: {field_size_acres} acres\n"
         f"Irrigation Method: {irrigation_method}\n"
-        f"Weather: {weather_info}\n"
+        f"{prompts.weather_context(weather_info)}\n"
         f"Suggest a 7-day irrigation schedule, total water needs, and 2-3 water-saving tips."
     )
 
@@ -111,22 +86,10 @@ def suggest_water_management():
         ],
         "temperature": 0.5
     }
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    prompts.record_tokens("water_management", payload)
 
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        reply = response.json()["choices"][0]["message"]["content"]
-
-        result = parser.parse(reply)
+        result = structured.complete(payload, WaterManagementPlan, cache="water_management")
         return jsonify(result.dict()), 200
 
     except requests.exceptions.RequestException as e:
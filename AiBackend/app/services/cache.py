@@ -0,0 +1,169 @@
+# cache.py
+#
+# Caches shared by the services layer: an in-process TTL/LRU map and a
+# SQLite-backed store that all workers on a host can read.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.services.pool import Pool
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    Once `maxsize` entries are held, the least recently used one is evicted.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is not self._MISSING:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, self._MISSING)
+        return default if entry is self._MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+def connect_wal(path: str) -> sqlite3.Connection:
+    """
+    Autocommit connection in WAL mode, usable from whichever thread checks it
+    out of a Pool (one at a time).
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SqliteCache:
+    """
+    Namespaced key/value store with per-entry expiry in a SQLite file, so
+    every gunicorn worker on the host shares one cache. Values are JSON.
+    """
+
+    # Expired rows are purged on every Nth write
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, pool_size: int = 8):
+        self.path = path
+        self._pool = Pool(lambda: connect_wal(path), pool_size)
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._pool.use() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+
+    def get_entry(self, namespace: str, key: str):
+        """Return (value, expires_at) for a live entry, else None."""
+        with self._pool.use() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def get(self, namespace: str, key: str, default=None):
+        entry = self.get_entry(namespace, key)
+        return default if entry is None else entry[0]
+
+    def set(self, namespace: str, key: str, value, ttl: float):
+        with self._pool.use() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def add(self, namespace: str, key: str, value, ttl: float) -> bool:
+        """Set the entry only if there is no live one; True if this call set it (a cross-worker lease)."""
+        now = time.time()
+        with self._pool.use() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ? AND expires_at <= ?", (namespace, key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, json.dumps(value), now + ttl),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str):
+        with self._pool.use() as conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str = None) -> int:
+        with self._pool.use() as conn:
+            if namespace is None:
+                cursor = conn.execute("DELETE FROM cache")
+            else:
+                cursor = conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+        return cursor.rowcount
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store() -> SqliteCache:
+    """The host-wide SQLite cache at Config.CACHE_DB_PATH."""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                from app.config import Config
+                _shared_store = SqliteCache(Config.CACHE_DB_PATH, Config.SQLITE_POOL_SIZE)
+    return _shared_store
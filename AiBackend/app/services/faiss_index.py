@@ -0,0 +1,135 @@
+# faiss_index.py
+#
+# Read-only FAISS backend for the agri_collection, built from the Chroma
+# chunks by build_faiss_index.py. The index file is memory-mapped and the
+# chunk texts live in a SQLite file opened read-only, so every gunicorn
+# worker on a host shares the same page-cache pages instead of holding its
+# own copy.
+
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from app.services.pool import Pool
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite3"
+META_FILE = "meta.json"
+
+
+def index_spec(kind: str, count: int, quantizer: str = None) -> str:
+    """
+    faiss.index_factory string for `kind` (flat, ivf or hnsw), optionally
+    storing vectors as int8 ("sq8") or product-quantized ("pq<M>") codes.
+    """
+    if kind == "flat":
+        return quantizer.upper() if quantizer else "Flat"
+    if kind == "ivf":
+        # ~sqrt(N) lists, at least 39 training points per list
+        nlist = max(1, min(int(count ** 0.5), count // 39))
+        return f"IVF{nlist},{quantizer.upper() if quantizer else 'Flat'}"
+    if kind == "hnsw":
+        return f"HNSW32,{quantizer.upper()}" if quantizer else "HNSW32"
+    raise ValueError(f"Unknown FAISS index kind: {kind}")
+
+
+def write_index(directory: str, spec: str, vectors: np.ndarray, texts: list[str], metadatas: list[dict], model: str):
+    """Train and fill a `spec` index over unit `vectors` and write it with its chunk store."""
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.index_factory(vectors.shape[1], spec, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add(vectors)
+
+    os.makedirs(directory, exist_ok=True)
+    faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+
+    chunks_path = os.path.join(directory, CHUNKS_FILE)
+    if os.path.exists(chunks_path):
+        os.remove(chunks_path)
+    conn = sqlite3.connect(chunks_path)
+    with conn:
+        conn.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+            ((i, text, json.dumps(metadata or {})) for i, (text, metadata) in enumerate(zip(texts, metadatas)))
+        )
+    conn.close()
+
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump({"spec": spec, "count": int(index.ntotal), "dim": int(vectors.shape[1]), "model": model}, f, indent=2)
+
+
+class FaissIndex:
+    """Memory-mapped index plus its chunk store; search returns LangChain Documents."""
+
+    def __init__(self, directory: str, nprobe: int = 16, ef_search: int = 64, pool_size: int = 8):
+        import faiss
+
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+
+        # IVF inverted lists are mapped with IO_FLAG_MMAP; flat, SQ/PQ and
+        # HNSW code arrays need IO_FLAG_MMAP_IFC where this faiss has it
+        if self.meta["spec"].startswith("IVF"):
+            flags = faiss.IO_FLAG_MMAP
+        else:
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        self.index = faiss.read_index(os.path.join(directory, INDEX_FILE), flags | faiss.IO_FLAG_READ_ONLY)
+
+        if self.meta["spec"].startswith("IVF"):
+            faiss.extract_index_ivf(self.index).nprobe = nprobe
+        elif self.meta["spec"].startswith("HNSW"):
+            self.index.hnsw.efSearch = ef_search
+
+        chunks_uri = "file:" + os.path.abspath(os.path.join(directory, CHUNKS_FILE)) + "?mode=ro"
+        self._pool = Pool(lambda: sqlite3.connect(chunks_uri, uri=True, check_same_thread=False), pool_size)
+
+    def count(self) -> int:
+        return int(self.index.ntotal)
+
+    def search_ids(self, vector, k: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        query = np.array(vector, dtype=np.float32).reshape(1, -1)
+        query /= np.linalg.norm(query) or 1.0
+        scores, ids = self.index.search(query, k)
+        return scores[0], ids[0]
+
+    def documents(self, ids) -> list:
+        from langchain_core.documents import Document
+
+        ids = [int(i) for i in ids if i >= 0]
+        if not ids:
+            return []
+        with self._pool.use() as conn:
+            rows = conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        by_id = {row[0]: Document(page_content=row[1], metadata=json.loads(row[2])) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def search(self, vector, k: int = 3) -> list:
+        """Top-k chunks for an already embedded query."""
+        _, ids = self.search_ids(vector, k)
+        return self.documents(ids)
+
+    def search_many(self, vectors, k: int = 3) -> list[list]:
+        """Top-k chunks for each row of `vectors`, in one index call."""
+        queries = np.array(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        _, ids = self.index.search(queries, k)
+        return [self.documents(row) for row in ids]
+
+
+def as_retriever(search, k: int = 3):
+    """LangChain retriever over `search(query, k)`, for chains that need one."""
+    from langchain_core.retrievers import BaseRetriever
+
+    class _Retriever(BaseRetriever):
+        def _get_relevant_documents(self, query, *, run_manager=None):
+            return search(query, k)
+
+    return _Retriever()
@@ -0,0 +1,70 @@
+# fanout.py
+#
+# Run independent upstream calls (soil, weather, ...) concurrently, each
+# with its own deadline. A call that fails or overruns yields its fallback
+# so the route can answer with partial data, and every call is timed.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+from app.services import metrics
+
+_executor = ThreadPoolExecutor(max_workers=Config.FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+def _timed(fn, args, deadline_at: float):
+    """
+    (result, error, elapsed seconds) of one call, timed on the thread that
+    ran it. The call gets what is left of its deadline as its `timeout`, so
+    it does not hold a pool thread long after the request gave up on it; a
+    call that waited in the queue past its deadline is not made at all.
+    """
+    start = time.perf_counter()
+    remaining = deadline_at - start
+    if remaining <= 0:
+        return None, TimeoutError("deadline passed before the call started"), 0.0
+    try:
+        return fn(*args, timeout=remaining), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def gather(calls: dict) -> tuple[dict, dict]:
+    """
+    `calls` maps a name to (fn, args, deadline_seconds, fallback); each is
+    run as fn(*args, timeout=seconds_left). Returns (results, timings):
+    results by name, and for each name its status ("ok", "timeout" or
+    "error") and elapsed milliseconds.
+
+    Answer cache hits inline instead of submitting them: time spent queued
+    behind other requests' calls counts against the deadline.
+    """
+    started = time.perf_counter()
+    futures = {
+        name: _executor.submit(_timed, fn, args, started + deadline)
+        for name, (fn, args, deadline, _) in calls.items()
+    }
+
+    results, timings = {}, {}
+    for name, (_, _, deadline, fallback) in calls.items():
+        remaining = max(0.0, started + deadline - time.perf_counter())
+        try:
+            result, error, elapsed = futures[name].result(timeout=remaining)
+        except TimeoutError:
+            results[name] = fallback
+            timings[name] = {"status": "timeout", "ms": round(deadline * 1000, 1)}
+        else:
+            if error is None:
+                results[name] = result
+                timings[name] = {"status": "ok", "ms": round(elapsed * 1000, 1)}
+            else:
+                print(f"[ERROR] Upstream call {name} failed: {error}")
+                results[name] = fallback
+                if isinstance(error, TimeoutError):
+                    # E.g. still queued at its deadline, so never started
+                    timings[name] = {"status": "timeout", "ms": round(deadline * 1000, 1)}
+                else:
+                    timings[name] = {"status": "error", "ms": round(elapsed * 1000, 1)}
+        metrics.incr(f"fanout.{name}.{timings[name]['status']}")
+    return results, timings
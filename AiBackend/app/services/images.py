@@ -0,0 +1,104 @@
+# images.py
+#
+# Preprocessing for vision-model uploads and a perceptual-hash cache so the
+# same (or a near-identical) photo is only diagnosed once.
+
+import io
+import threading
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.services import metrics
+from app.services.cache import get_shared_store
+
+
+def prepare_image(image_bytes: bytes, max_side: int, quality: int):
+    """
+    Decode an upload, apply its EXIF orientation, shrink it so the longer
+    side is at most `max_side` and re-encode it as JPEG.
+    Returns (jpeg_bytes, decoded_image); raises ValueError if undecodable.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft("RGB", (max_side, max_side))  # JPEG: decode at reduced scale
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Unsupported or corrupt image: {e}")
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue(), image
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """64-bit difference hash: robust to rescaling, recompression and small edits."""
+    gray = image.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+class PerceptualCache:
+    """
+    Results keyed by image hash. Exact hashes are shared across workers via
+    the SQLite store; near-duplicates (Hamming distance <= `max_distance`)
+    are matched against this worker's most recent `maxsize` entries.
+    """
+
+    def __init__(self, name: str, max_distance: int, maxsize: int, ttl: float):
+        self.name = name
+        self.max_distance = max_distance
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = {}  # (hash, variant) -> (result, expires_at), oldest first
+        self._lock = threading.Lock()
+
+    def _remember(self, image_hash: int, variant: str, result, expires_at: float):
+        with self._lock:
+            self._entries.pop((image_hash, variant), None)
+            self._entries[(image_hash, variant)] = (result, expires_at)
+            while len(self._entries) > self.maxsize:
+                self._entries.pop(next(iter(self._entries)))
+
+    def get(self, image_hash: int, variant: str):
+        now = time.time()
+        best = None
+        with self._lock:
+            for (known_hash, known_variant), (result, expires_at) in self._entries.items():
+                if known_variant != variant or expires_at <= now:
+                    continue
+                distance = (known_hash ^ image_hash).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, result)
+        if best is not None:
+            metrics.incr(f"image_cache.{self.name}.{'exact' if best[0] == 0 else 'near'}_hit")
+            return best[1]
+
+        try:
+            entry = get_shared_store().get_entry(f"image:{self.name}", f"{image_hash:016x}:{variant}")
+        except Exception as e:
+            print(f"[ERROR] Image cache read failed: {e}")
+            entry = None
+        if entry is not None:
+            self._remember(image_hash, variant, *entry)
+            metrics.incr(f"image_cache.{self.name}.shared_hit")
+            return entry[0]
+
+        metrics.incr(f"image_cache.{self.name}.miss")
+        return None
+
+    def set(self, image_hash: int, variant: str, result):
+        self._remember(image_hash, variant, result, time.time() + self.ttl)
+        try:
+            get_shared_store().set(f"image:{self.name}", f"{image_hash:016x}:{variant}", result, self.ttl)
+        except Exception as e:
+            print(f"[ERROR] Image cache write failed: {e}")
@@ -0,0 +1,91 @@
+# lazy.py
+#
+# Thread-safe, load-once holders for heavy per-worker resources (models,
+# vector stores, agents). Every holder registers itself so the health
+# blueprint can report and warm them.
+
+import threading
+import time
+
+_registry = {}
+
+# Startup warmup (WARMUP_ON_START): "off", "running" or "done"
+_startup = {"state": "off", "errors": {}}
+
+
+class LazyResource:
+    """
+    Build `loader()` on first `get()` and hand the same object to every caller.
+    `enabled`, when given, says whether the current configuration uses the
+    resource at all; disabled ones are left out of status and warmup.
+    """
+
+    def __init__(self, name: str, loader, enabled=None):
+        self.name = name
+        self._loader = loader
+        self._enabled = enabled
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        _registry[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled is None or self._enabled()
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    self._value = self._loader()
+                    self.load_seconds = time.perf_counter() - start
+                    self._loaded = True
+        return self._value
+
+
+def status() -> dict:
+    return {
+        name: {
+            "loaded": resource.loaded,
+            "load_seconds": round(resource.load_seconds, 3) if resource.loaded else None,
+        }
+        for name, resource in _registry.items()
+        if resource.enabled
+    }
+
+
+def warm(names=None) -> dict:
+    """Load the named resources (all registered ones by default); return errors by name."""
+    errors = {}
+    for name in names or [name for name, resource in _registry.items() if resource.enabled]:
+        resource = _registry.get(name)
+        if resource is None:
+            errors[name] = "unknown component"
+            continue
+        try:
+            resource.get()
+        except Exception as e:
+            print(f"[ERROR] Warmup of {name} failed: {e}")
+            errors[name] = str(e)
+    return errors
+
+
+def start_warmup():
+    """Warm every enabled resource in a background thread; readiness waits for it."""
+    _startup["state"] = "running"
+
+    def run():
+        _startup["errors"] = warm()
+        _startup["state"] = "done"
+
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+
+
+def warmup_state() -> dict:
+    return dict(_startup)
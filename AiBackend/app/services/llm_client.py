@@ -0,0 +1,216 @@
+# llm_client.py
+#
+# Shared Groq chat-completions client. One keep-alive session per worker so
+# every blueprint reuses pooled TLS connections instead of opening a new one
+# per request. Completions can be cached by exact request: first in a
+# per-worker LRU, then in the host-wide SQLite store.
+
+import hashlib
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import Config
+from app.services import metrics
+from app.services.cache import TTLCache, get_shared_store
+
+# Status codes worth retrying: rate limiting and transient upstream failures.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=Config.GROQ_POOL_SIZE,
+                    pool_maxsize=Config.GROQ_POOL_SIZE,
+                    max_retries=0,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "Authorization": f"Bearer {Config.GROQ_API_KEY}",
+                    "Content-Type": "application/json",
+                })
+                _session = session
+    return _session
+
+
+def _backoff(attempt: int, retry_after: str = None) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when sent."""
+    if retry_after:
+        try:
+            return min(float(retry_after), Config.GROQ_BACKOFF_MAX)
+        except ValueError:
+            pass
+    ceiling = min(Config.GROQ_BACKOFF_MAX, Config.GROQ_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def post_chat(payload: dict, timeout: float = None, max_retries: int = None, stream: bool = False) -> requests.Response:
+    """
+    POST `payload` to the chat-completions endpoint and return the raw
+    response. Connection errors, timeouts and retryable statuses are retried
+    with jittered backoff; the last response (or exception) is surfaced.
+    With `stream`, the body is left unread for the caller to iterate.
+    """
+    session = get_session()
+    read_timeout = timeout if timeout is not None else Config.GROQ_READ_TIMEOUT
+    retries = Config.GROQ_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(
+                Config.GROQ_URL,
+                json=payload,
+                timeout=(Config.GROQ_CONNECT_TIMEOUT, read_timeout),
+                stream=stream,
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            retry_after = response.headers.get("Retry-After")
+            # Release the pooled connection (left checked out by an unread stream)
+            response.close()
+            time.sleep(_backoff(attempt, retry_after))
+            continue
+        return response
+
+
+# ─── RESPONSE CACHE ───────────────────────────────────────────────────────────
+
+# Generation parameters, besides model/messages/temperature, that change the output
+_KEYED_PARAMS = ("max_tokens", "top_p", "response_format", "stop")
+
+_memory_cache = TTLCache(maxsize=Config.LLM_CACHE_MEMORY_SIZE, ttl=Config.LLM_CACHE_TTLS["default"])
+
+
+def _normalize_content(content):
+    if isinstance(content, str):
+        return "\n".join(line.rstrip() for line in content.strip().splitlines())
+    return content
+
+
+def cache_key(payload: dict) -> str:
+    """Stable hash of everything in `payload` that determines the completion."""
+    normalized = {
+        "model": payload.get("model"),
+        "messages": [
+            {"role": m.get("role"), "content": _normalize_content(m.get("content"))}
+            for m in payload.get("messages", [])
+        ],
+        "temperature": payload.get("temperature"),
+    }
+    for param in _KEYED_PARAMS:
+        if param in payload:
+            normalized[param] = payload[param]
+    encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def cache_ttl(endpoint: str) -> float:
+    return Config.LLM_CACHE_TTLS.get(endpoint, Config.LLM_CACHE_TTLS["default"])
+
+
+def cached_content(endpoint: str, key: str):
+    content = _memory_cache.get((endpoint, key))
+    if content is not None:
+        metrics.incr(f"llm_cache.{endpoint}.memory_hit")
+        return content
+
+    try:
+        entry = get_shared_store().get_entry("llm:" + endpoint, key)
+    except Exception as e:
+        print(f"[ERROR] LLM cache read failed: {e}")
+        entry = None
+    if entry is not None:
+        content, expires_at = entry
+        _memory_cache.set((endpoint, key), content, ttl=max(expires_at - time.time(), 0))
+        metrics.incr(f"llm_cache.{endpoint}.disk_hit")
+        return content
+
+    metrics.incr(f"llm_cache.{endpoint}.miss")
+    return None
+
+
+def store_content(endpoint: str, key: str, content: str):
+    ttl = cache_ttl(endpoint)
+    _memory_cache.set((endpoint, key), content, ttl=ttl)
+    try:
+        get_shared_store().set("llm:" + endpoint, key, content, ttl)
+    except Exception as e:
+        print(f"[ERROR] LLM cache write failed: {e}")
+
+
+def chat_completion(payload: dict, timeout: float = None, cache: str = None) -> str:
+    """
+    Run a chat completion and return the first choice's message content.
+    With `cache` set to an endpoint name, identical requests are answered
+    from the response cache for that endpoint's TTL.
+    """
+    use_cache = cache is not None and Config.LLM_CACHE_ENABLED
+    if use_cache:
+        key = cache_key(payload)
+        content = cached_content(cache, key)
+        if content is not None:
+            return content
+
+    response = post_chat(payload, timeout=timeout)
+    response.raise_for_status()
+    content = response.json()["choices"][0]["message"]["content"]
+
+    if use_cache:
+        store_content(cache, key, content)
+    return content
+
+
+def stream_chat(payload: dict, timeout: float = None, cache: str = None):
+    """
+    Yield the completion's content as it is generated. A cached completion is
+    yielded as a single chunk; a streamed one is cached once it finishes.
+    """
+    use_cache = cache is not None and Config.LLM_CACHE_ENABLED
+    if use_cache:
+        key = cache_key(payload)
+        content = cached_content(cache, key)
+        if content is not None:
+            yield content
+            return
+
+    response = post_chat({**payload, "stream": True}, timeout=timeout, stream=True)
+    response.raise_for_status()
+    parts = []
+    with response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)["choices"][0]["delta"].get("content")
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    if use_cache:
+        store_content(cache, key, "".join(parts))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for Llama tokenizers on English)."""
+    return len(text) // 4 + 1
@@ -0,0 +1,23 @@
+# metrics.py
+#
+# Per-worker counters, exposed on GET /health/metrics.
+
+import threading
+from collections import defaultdict
+
+_counters = defaultdict(int)
+_lock = threading.Lock()
+
+
+def incr(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def get(name: str) -> int:
+    return _counters.get(name, 0)
+
+
+def snapshot(prefix: str = "") -> dict:
+    with _lock:
+        return {name: value for name, value in sorted(_counters.items()) if name.startswith(prefix)}
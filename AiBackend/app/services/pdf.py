@@ -0,0 +1,59 @@
+# pdf.py
+#
+# Bounded-memory handling of uploaded PDFs: uploads are copied to disk in
+# fixed-size blocks with a size cap, opened from the file so MuPDF reads
+# pages on demand, and text is produced one page at a time.
+
+import hashlib
+import os
+import tempfile
+
+import fitz  # PyMuPDF
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """The upload breaks a configured size or page limit."""
+
+
+def spool_upload(file_storage, max_bytes: int) -> tuple[str, str]:
+    """
+    Copy an uploaded file to a temporary file in blocks and return its path
+    and the SHA-256 of its bytes. Stops, deletes the partial copy and raises
+    UploadRejected as soon as more than `max_bytes` have been read. The
+    caller removes the file when done.
+    """
+    handle, path = tempfile.mkstemp(suffix=".pdf")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(handle, "wb") as out:
+            while True:
+                block = file_storage.stream.read(BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    raise UploadRejected(f"File exceeds the {max_bytes // 2**20} MB upload limit.")
+                digest.update(block)
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def open_pdf(path: str, max_pages: int):
+    """Open a PDF from disk, rejecting it before any text extraction if it has too many pages."""
+    doc = fitz.open(path, filetype="pdf")
+    if doc.page_count > max_pages:
+        doc.close()
+        raise UploadRejected(f"PDF has more than {max_pages} pages.")
+    return doc
+
+
+def iter_page_text(doc):
+    """Yield each page's text in order without holding earlier pages."""
+    for page in doc:
+        yield page.get_text()
@@ -0,0 +1,51 @@
+# pool.py
+#
+# Bounded pools of reusable per-worker objects (SQLite connections, crewai
+# agent sets). Unlike a threading.local, a pooled object outlives the thread
+# or greenlet that used it: under gevent every connection gets a fresh
+# greenlet, so thread-local holders would rebuild their object per request.
+
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class Pool:
+    """
+    Up to `size` objects built by `factory()` on demand. `use()` checks one
+    out for the duration of a `with` block, waiting for a free one once all
+    `size` exist.
+    """
+
+    def __init__(self, factory, size: int):
+        self._factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def use(self):
+        item = self._acquire()
+        try:
+            yield item
+        finally:
+            self._idle.put(item)
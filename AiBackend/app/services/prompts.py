@@ -0,0 +1,100 @@
+# prompts.py
+#
+# Compact building blocks for LLM prompts. Forecasts are rendered as a small
+# table plus derived agronomic figures instead of a dict repr, schemas as
+# minified JSON Schema instead of LangChain's format-instruction prose, and
+# every prompt's estimated size is counted per endpoint.
+
+import json
+from functools import lru_cache
+
+from app.services import llm_client, metrics
+
+# Table column per forecast field: (header, decimals)
+_COLUMNS = {
+    "temp_max": ("tmax_c", 1),
+    "temp_min": ("tmin_c", 1),
+    "humidity_max": ("rh_max", 0),
+    "humidity_min": ("rh_min", 0),
+    "precipitation": ("rain_mm", 1),
+    "wind_speed_max": ("wind_kmh", 0),
+    "evapotranspiration": ("et0_mm", 1),
+}
+
+# Daily rainfall that counts as a rain day (IMD definition)
+RAIN_DAY_MM = 2.5
+
+
+def _cell(value, decimals: int) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.{decimals}f}" if decimals else str(round(value))
+
+
+def forecast_table(forecast: dict) -> str:
+    """One row per day, pipe-separated, only for the fields present."""
+    fields = [field for field in _COLUMNS if forecast.get(field)]
+    rows = ["|".join(["date"] + [_COLUMNS[field][0] for field in fields])]
+    for i, date in enumerate(forecast.get("dates", [])):
+        values = [_cell(forecast[field][i] if i < len(forecast[field]) else None, _COLUMNS[field][1]) for field in fields]
+        rows.append("|".join([date] + values))
+    return "\n".join(rows)
+
+
+def forecast_summary(forecast: dict, base_temp: float = 10.0) -> str:
+    """Derived figures: rain days and total, growing degree days, peak ET0, temperature range."""
+    parts = []
+    rain = [value for value in forecast.get("precipitation", []) if value is not None]
+    if rain:
+        rain_days = sum(1 for value in rain if value >= RAIN_DAY_MM)
+        parts.append(f"rain days {rain_days}/{len(rain)}, total {sum(rain):.1f} mm")
+
+    highs, lows = forecast.get("temp_max", []), forecast.get("temp_min", [])
+    days = [(high, low) for high, low in zip(highs, lows) if high is not None and low is not None]
+    if days:
+        gdd = sum(max(0.0, (high + low) / 2 - base_temp) for high, low in days)
+        parts.append(f"GDD(base {base_temp:g}C) {gdd:.0f}")
+        parts.append(f"temp {min(low for _, low in days):.0f}-{max(high for high, _ in days):.0f}C")
+
+    et = [value for value in forecast.get("evapotranspiration", []) if value is not None]
+    if et:
+        parts.append(f"ET0 max {max(et):.1f} mm/day, total {sum(et):.1f} mm")
+    return "; ".join(parts)
+
+
+def weather_context(forecast: dict, base_temp: float = 10.0) -> str:
+    """Forecast block for a user prompt."""
+    if not forecast or not forecast.get("dates"):
+        return "Weather forecast: unavailable"
+    summary = forecast_summary(forecast, base_temp)
+    return (
+        f"Weather forecast ({len(forecast['dates'])} days):\n{forecast_table(forecast)}"
+        + (f"\nSummary: {summary}" if summary else "")
+    )
+
+
+def _strip_titles(node):
+    if isinstance(node, dict):
+        return {key: _strip_titles(value) for key, value in node.items() if not (key == "title" and isinstance(value, str))}
+    if isinstance(node, list):
+        return [_strip_titles(value) for value in node]
+    return node
+
+
+@lru_cache(maxsize=None)
+def format_instructions(schema) -> str:
+    """Output instructions for a Pydantic model, rendered once per schema."""
+    compact = json.dumps(_strip_titles(schema.model_json_schema()), separators=(",", ":"), ensure_ascii=False)
+    return f"Respond with only a JSON object (no prose, no code fences) valid against this JSON Schema:\n{compact}"
+
+
+def record_tokens(endpoint: str, payload: dict) -> int:
+    """Estimate the prompt size of `payload` and add it to the endpoint's metrics."""
+    tokens = sum(
+        llm_client.estimate_tokens(message["content"])
+        for message in payload.get("messages", [])
+        if isinstance(message.get("content"), str)
+    )
+    metrics.incr(f"prompt.{endpoint}.requests")
+    metrics.incr(f"prompt.{endpoint}.tokens", tokens)
+    return tokens
@@ -0,0 +1,143 @@
+# retrieval.py
+#
+# One embedding model and one vector index per worker, shared by every
+# blueprint that does RAG (govscheme, translate, agri_advisory). Both are
+# built on first use behind a lock. Config.VECTOR_BACKEND selects the index:
+# the Chroma collection, or a memory-mapped FAISS copy of it.
+
+import os
+
+from app.config import Config
+from app.services.lazy import LazyResource
+
+
+def _load_embeddings():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=Config.EMBED_MODEL)
+
+
+def _load_vectorstore():
+    from langchain_community.vectorstores import Chroma
+    return Chroma(
+        collection_name=Config.VECTOR_COLLECTION,
+        persist_directory=Config.VECTOR_PERSIST_DIR,
+        embedding_function=embeddings.get()
+    )
+
+
+def _load_faiss_index():
+    from app.services.faiss_index import FaissIndex
+    return FaissIndex(Config.FAISS_INDEX_DIR, nprobe=Config.FAISS_NPROBE, ef_search=Config.FAISS_EF_SEARCH,
+                      pool_size=Config.SQLITE_POOL_SIZE)
+
+
+def use_faiss() -> bool:
+    return Config.VECTOR_BACKEND == "faiss"
+
+
+embeddings = LazyResource("embeddings", _load_embeddings)
+vectorstore = LazyResource("vectorstore", _load_vectorstore, enabled=lambda: not use_faiss())
+faiss_index = LazyResource("faiss_index", _load_faiss_index, enabled=use_faiss)
+
+
+def get_embeddings():
+    return embeddings.get()
+
+
+def get_vectorstore():
+    return vectorstore.get()
+
+
+def get_retriever(k: int = 3):
+    if use_faiss():
+        from app.services.faiss_index import as_retriever
+        return as_retriever(retrieve, k)
+    return get_vectorstore().as_retriever(search_type="similarity", search_kwargs={"k": k})
+
+
+def retrieve(query: str, k: int = 3) -> list:
+    """Top-k chunks for `query` as LangChain Documents."""
+    if use_faiss():
+        return faiss_index.get().search(embed_query(query), k=k)
+    return get_vectorstore().similarity_search(query, k=k)
+
+
+def embed_query(text: str) -> list:
+    return get_embeddings().embed_query(text)
+
+
+def retrieve_by_vector(vector, k: int = 3) -> list:
+    """Top-k chunks for an already embedded query."""
+    if use_faiss():
+        return faiss_index.get().search(vector, k=k)
+    return get_vectorstore().similarity_search_by_vector(vector, k=k)
+
+
+def embed_queries(texts: list[str]) -> list:
+    """Embed several queries in one batched forward pass."""
+    return get_embeddings().embed_documents(texts)
+
+
+def retrieve_by_vectors(vectors, k: int = 3) -> list[list]:
+    """Top-k chunks for each of several embedded queries, searched together."""
+    if use_faiss():
+        return faiss_index.get().search_many(vectors, k=k)
+
+    from langchain_core.documents import Document
+
+    results = get_vectorstore()._collection.query(
+        query_embeddings=[list(vector) for vector in vectors], n_results=k, include=["documents", "metadatas"]
+    )
+    return [
+        [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+        for texts, metadatas in zip(results["documents"], results["metadatas"])
+    ]
+
+
+# ─── MEMORY FOOTPRINT ─────────────────────────────────────────────────────────
+
+def _rss_bytes() -> int:
+    """Current resident set size, falling back to the peak where /proc is absent."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _model_bytes(model) -> int:
+    client = getattr(model, "client", None)
+    if client is None or not hasattr(client, "parameters"):
+        return 0
+    return sum(p.numel() * p.element_size() for p in client.parameters())
+
+
+def footprint() -> dict:
+    """Memory used by the shared retrieval stack in this worker."""
+    report = {
+        "process_rss_mb": round(_rss_bytes() / 2**20, 1),
+        "embeddings": {"loaded": embeddings.loaded, "model": Config.EMBED_MODEL},
+        "vectorstore": {"loaded": vectorstore.loaded, "collection": Config.VECTOR_COLLECTION},
+        "backend": Config.VECTOR_BACKEND,
+    }
+    if embeddings.loaded:
+        report["embeddings"]["weights_mb"] = round(_model_bytes(embeddings.get()) / 2**20, 1)
+        report["embeddings"]["load_seconds"] = round(embeddings.load_seconds, 2)
+    if vectorstore.loaded:
+        report["vectorstore"]["chunks"] = vectorstore.get()._collection.count()
+        report["vectorstore"]["load_seconds"] = round(vectorstore.load_seconds, 2)
+    if faiss_index.loaded:
+        # Mapped pages are shared with other workers and only partly counted in RSS
+        report["faiss_index"] = {
+            **faiss_index.get().meta,
+            "load_seconds": round(faiss_index.load_seconds, 2),
+            "file_mb": round(os.path.getsize(os.path.join(Config.FAISS_INDEX_DIR, "index.faiss")) / 2**20, 1),
+        }
+    return report
@@ -0,0 +1,160 @@
+# semantic_cache.py
+#
+# Answer cache keyed by query meaning rather than exact text. Queries are
+# embedded with the shared MiniLM model; a new query reuses a stored answer
+# when its cosine similarity to a previous query in the same language clears
+# a threshold. Invalidation is broadcast to every worker through a
+# generation counter in the shared SQLite store.
+
+import threading
+import time
+
+import numpy as np
+
+from app.services import metrics
+from app.services.cache import get_shared_store
+
+_GENERATION_NS = "semantic_cache"
+# How often a worker re-reads the shared invalidation generation
+_GENERATION_CHECK_SECONDS = 5.0
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Bucket:
+    """Fixed-capacity matrix of unit query vectors for one language."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.entries = [None] * capacity  # (query, answer)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+        self.generation = None
+        self.generation_checked = 0.0
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Similarity of `query` to every stored entry; expired entries score -inf."""
+        scores = self.vectors[:self.size] @ query
+        scores[self.expires_at[:self.size] <= time.time()] = -np.inf
+        return scores
+
+    def slot_for_insert(self, query: np.ndarray, threshold: float) -> int:
+        if self.size:
+            # A fresh entry the new query would match is superseded in place
+            scores = self.scores(query)
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                return best
+        # Then an expired entry's slot, then a new one
+        expired = np.flatnonzero(self.expires_at[:self.size] <= time.time())
+        if expired.size:
+            return int(expired[0])
+        if self.size < len(self.entries):
+            self.size += 1
+            return self.size - 1
+        return int(np.argmin(self.last_used))  # evict least recently used
+
+
+class SemanticCache:
+
+    def __init__(self, name: str, threshold: float, maxsize: int, ttl: float):
+        self.name = name
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    # ── cross-worker invalidation ──
+
+    def _read_generation(self, lang: str) -> tuple:
+        """(global, per-language) generation counters from the shared store."""
+        try:
+            store = get_shared_store()
+            return (store.get(_GENERATION_NS, self.name, 0), store.get(_GENERATION_NS, f"{self.name}:{lang}", 0))
+        except Exception as e:
+            print(f"[ERROR] Semantic cache generation read failed: {e}")
+            return None
+
+    def _bump_generation(self, key: str):
+        store = get_shared_store()
+        store.set(_GENERATION_NS, key, store.get(_GENERATION_NS, key, 0) + 1, ttl=10 * 365 * 24 * 3600)
+
+    def _current_bucket(self, lang: str):
+        """The language's bucket, dropped first if another worker invalidated it."""
+        bucket = self._buckets.get(lang)
+        now = time.monotonic()
+        if bucket is None or now - bucket.generation_checked < _GENERATION_CHECK_SECONDS:
+            return bucket
+        bucket.generation_checked = now
+        generation = self._read_generation(lang)
+        if generation is not None and generation != bucket.generation:
+            del self._buckets[lang]
+            return None
+        return bucket
+
+    # ── public API ──
+
+    def lookup(self, lang: str, vector):
+        """Return (answer, matched_query, score) for the closest fresh entry, else None."""
+        query = _unit(vector)
+        with self._lock:
+            bucket = self._current_bucket(lang)
+            if bucket is None or bucket.size == 0:
+                metrics.incr(f"semantic_cache.{self.name}.miss")
+                return None
+
+            scores = bucket.scores(query)
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            entry = bucket.entries[best]
+            if score < self.threshold:
+                metrics.incr(f"semantic_cache.{self.name}.miss")
+                return None
+
+            bucket.last_used[best] = time.monotonic()
+        metrics.incr(f"semantic_cache.{self.name}.hit")
+        return entry[1], entry[0], score
+
+    def add(self, lang: str, query: str, vector, answer: str):
+        unit = _unit(vector)
+        with self._lock:
+            bucket = self._current_bucket(lang)
+            if bucket is None:
+                bucket = self._buckets[lang] = _Bucket(self.maxsize, unit.shape[0])
+                bucket.generation = self._read_generation(lang)
+                bucket.generation_checked = time.monotonic()
+            slot = bucket.slot_for_insert(unit, self.threshold)
+            bucket.vectors[slot] = unit
+            bucket.entries[slot] = (query, answer)
+            bucket.expires_at[slot] = time.time() + self.ttl
+            bucket.last_used[slot] = time.monotonic()
+
+    def invalidate(self, lang: str = None) -> int:
+        """
+        Drop cached answers for one language, or all of them. The shared
+        generation is bumped so other workers drop theirs on their next check.
+        """
+        with self._lock:
+            if lang is None:
+                dropped = sum(bucket.size for bucket in self._buckets.values())
+                self._buckets.clear()
+                self._bump_generation(self.name)
+            else:
+                bucket = self._buckets.pop(lang, None)
+                dropped = bucket.size if bucket else 0
+                self._bump_generation(f"{self.name}:{lang}")
+            return dropped
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "maxsize_per_language": self.maxsize,
+                "languages": {lang: bucket.size for lang, bucket in self._buckets.items()},
+            }
@@ -0,0 +1,201 @@
+# soil.py
+#
+# OpenEPI soil properties behind a persistent SQLite tile cache. Soil data
+# at a location is effectively static, so each grid cell is fetched once and
+# then served from disk across restarts and by every gunicorn worker.
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.config import Config
+from app.services.cache import connect_wal
+from app.services.pool import Pool
+
+SOIL_URL = "https://api.openepi.io/soil/property"
+
+DEFAULT_SOIL_DATA = {
+    "soil_ph": 6.5,
+    "soil_organic_carbon": 1.2,
+    "soil_nitrogen": 0.1,
+    "soil_clay": 20.0,
+    "soil_organic_carbon_stock": 50.0
+}
+
+# OpenEPI property -> soil_data key, for the 0-5cm request
+SURFACE_PROPERTIES = {
+    "phh2o": "soil_ph",
+    "nitrogen": "soil_nitrogen",
+    "soc": "soil_organic_carbon",
+    "clay": "soil_clay",
+}
+
+_session = requests.Session()
+
+
+# ─── GRID ─────────────────────────────────────────────────────────────────────
+
+def cell_for(lat, lon) -> tuple:
+    """Integer (row, col) of the grid cell containing (lat, lon)."""
+    size = Config.SOIL_GRID_DEG
+    # The epsilon keeps edges like 10.10 / 0.01 from flooring into the cell below
+    return (math.floor(float(lat) / size + 1e-9), math.floor(float(lon) / size + 1e-9))
+
+
+def cell_center(cell) -> tuple:
+    size = Config.SOIL_GRID_DEG
+    return (round((cell[0] + 0.5) * size, 6), round((cell[1] + 0.5) * size, 6))
+
+
+# ─── TILE STORE ───────────────────────────────────────────────────────────────
+
+class SoilTileStore:
+    """SQLite-backed map of grid cell -> soil properties, safe across workers."""
+
+    def __init__(self, path: str, grid_deg: float):
+        self.path = path
+        self.grid = repr(grid_deg)
+        self._pool = Pool(lambda: connect_wal(path), Config.SQLITE_POOL_SIZE)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._pool.use() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS soil_tiles ("
+                " grid TEXT NOT NULL, row INTEGER NOT NULL, col INTEGER NOT NULL,"
+                " data TEXT NOT NULL, fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (grid, row, col))"
+            )
+
+    def get(self, cell):
+        with self._pool.use() as conn:
+            row = conn.execute(
+                "SELECT data FROM soil_tiles WHERE grid = ? AND row = ? AND col = ?",
+                (self.grid, cell[0], cell[1]),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, cell, data: dict):
+        with self._pool.use() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO soil_tiles (grid, row, col, data, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (self.grid, cell[0], cell[1], json.dumps(data), time.time()),
+            )
+
+    def count(self) -> int:
+        with self._pool.use() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM soil_tiles WHERE grid = ?", (self.grid,)
+            ).fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SoilTileStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SoilTileStore(Config.SOIL_CACHE_PATH, Config.SOIL_GRID_DEG)
+    return _store
+
+
+# ─── OPENEPI ──────────────────────────────────────────────────────────────────
+
+def fetch_surface_properties(lat, lon, timeout: float = None) -> dict:
+    """pH, nitrogen, SOC and clay at 0-5cm; keys are None where unavailable. Raises if the request fails."""
+    params = [("lon", lon), ("lat", lat), ("depths", "0-5cm"), ("depths", "0-30cm")]
+    params += [("properties", prop) for prop in SURFACE_PROPERTIES]
+    params.append(("values", "mean"))
+    response = _session.get(SOIL_URL, params=params, timeout=timeout or Config.SOIL_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+
+    soil_data = {key: None for key in SURFACE_PROPERTIES.values()}
+    for prop in data.get('properties', []):
+        key = SURFACE_PROPERTIES.get(prop['property'])
+        if key:
+            soil_data[key] = prop['depth_0_5']['mean']
+    return soil_data
+
+
+def fetch_carbon_stock(lat, lon, timeout: float = None):
+    """Organic carbon stock at 0-30cm, or None where unavailable. Raises if the request fails."""
+    params = [("lon", lon), ("lat", lat), ("depths", "0-30cm"), ("properties", "ocs"), ("values", "mean")]
+    response = _session.get(SOIL_URL, params=params, timeout=timeout or Config.SOIL_TIMEOUT)
+    response.raise_for_status()
+    for prop in response.json().get('properties', []):
+        if prop['property'] == 'ocs':
+            return prop['depth_0_30']['mean']
+    return None
+
+
+def fetch_soil_properties(lat, lon) -> dict:
+    """Both OpenEPI requests; raises if either fails, so a partial tile is never stored."""
+    soil_data = fetch_surface_properties(lat, lon)
+    soil_data["soil_organic_carbon_stock"] = fetch_carbon_stock(lat, lon)
+    return soil_data
+
+
+def with_defaults(soil_data: dict) -> dict:
+    """Fill properties the upstream could not provide with agronomic defaults."""
+    filled = dict(DEFAULT_SOIL_DATA)
+    filled.update({key: value for key, value in soil_data.items() if value is not None})
+    return filled
+
+
+# ─── PUBLIC API ───────────────────────────────────────────────────────────────
+
+def load_cell(cell, refresh: bool = False):
+    """
+    Fetch and persist one cell unless already stored. Returns the raw
+    properties; raises, without storing anything, if either request fails.
+    """
+    store = get_store()
+    if not refresh:
+        cached = store.get(cell)
+        if cached is not None:
+            return cached
+
+    lat, lon = cell_center(cell)
+    soil_data = fetch_soil_properties(lat, lon)
+    save_cell(cell, soil_data)
+    return soil_data
+
+
+def save_cell(cell, soil_data: dict):
+    """
+    Persist a tile. Tiles never expire, so callers pass only data for which
+    both OpenEPI requests succeeded; an all-empty answer is skipped too.
+    """
+    if any(value is not None for value in soil_data.values()):
+        get_store().put(cell, soil_data)
+
+
+def preload_bbox(min_lat, min_lon, max_lat, max_lon, workers: int = 4, refresh: bool = False) -> dict:
+    """
+    Warm the tile cache for every cell in a bounding box, e.g. a district.
+    Returns counts of loaded and failed cells.
+    """
+    first = cell_for(min_lat, min_lon)
+    last = cell_for(max_lat, max_lon)
+    cells = [(row, col) for row in range(first[0], last[0] + 1) for col in range(first[1], last[1] + 1)]
+
+    loaded = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(load_cell, cell, refresh) for cell in cells]
+        for future in futures:
+            try:
+                future.result()
+                loaded += 1
+            except Exception as e:
+                print(f"[ERROR] Soil preload failed: {e}")
+                failed += 1
+    return {"cells": len(cells), "loaded": loaded, "failed": failed}
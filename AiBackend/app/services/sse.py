@@ -0,0 +1,61 @@
+# sse.py
+#
+# Server-sent-event helpers for routes that can stream LLM output. Clients
+# opt in with ?stream=true or `Accept: text/event-stream` and receive:
+#   event: status  data: {"stage": ...}                  (progress, optional)
+#   event: token   data: {"content": "<text delta>"}     (repeated)
+#   event: done    data: <the route's usual JSON body>
+#   event: error   data: {"error": "<message>"}
+
+import json
+
+from flask import Response, request, stream_with_context
+
+from app.services import llm_client
+
+
+def wants_stream() -> bool:
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+
+def event(data: dict, name: str = None) -> str:
+    prefix = f"event: {name}\n" if name else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events) -> Response:
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        # Stop proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def completion_events(payload: dict, build_final, cache: str = None):
+    """
+    Token events for a chat completion, then `build_final(text)` (the
+    route's normal response body) as the done event. Routes that first
+    report progress of their own chain these after their status events.
+    """
+    parts = []
+    try:
+        for delta in llm_client.stream_chat(payload, cache=cache):
+            parts.append(delta)
+            yield event({"content": delta}, "token")
+        yield event(build_final("".join(parts)), "done")
+    except Exception as e:
+        print(f"[ERROR] Streaming completion failed: {e}")
+        yield event({"error": str(e)}, "error")
+
+
+def stream_completion(payload: dict, build_final, cache: str = None) -> Response:
+    """Relay a chat completion as token events followed by the done event."""
+    return sse_response(completion_events(payload, build_final, cache))
+
+
+def stream_text(text: str, final: dict) -> Response:
+    """Stream an already available answer (e.g. a cache hit) in the same event format."""
+    return sse_response(iter([event({"content": text}, "token"), event(final, "done")]))
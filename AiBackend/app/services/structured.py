@@ -0,0 +1,212 @@
+# structured.py
+#
+# JSON completions parsed into Pydantic models without failing on the usual
+# model slips. Payloads request the provider's JSON mode; replies that still
+# do not validate go through a local repair pass (strip prose and code
+# fences, fix trailing commas, smart quotes and Python literals, coerce
+# "12 kg" into numeric fields) and only then a single corrective re-ask.
+# Outcomes are counted as structured.<endpoint>.{clean,repaired,reasked,failed}.
+
+import json
+import re
+
+import requests
+from pydantic import BaseModel, ValidationError
+
+from app.config import Config
+from app.services import llm_client, metrics
+
+JSON_MODE = {"type": "json_object"}
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class StructuredOutputError(ValueError):
+    """The model's reply could not be turned into the requested schema."""
+
+
+def extract_json(text: str):
+    """The first balanced {...} object in `text` (inside a code fence if there is one), else None."""
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]  # truncated; let the repair pass try to close it
+
+
+def _outside_strings(text: str, fix) -> str:
+    """Apply `fix` to the parts of a JSON text that are not string literals."""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    return "".join(part if i % 2 else fix(part) for i, part in enumerate(parts))
+
+
+def _close_brackets(text: str) -> str:
+    stack, in_string, escaped = [], False, False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    return text + ('"' if in_string else "") + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    # Smart quotes become delimiters only outside string literals; inside a
+    # value ("Use “neem” oil") they are text and must stay as they are
+    text = _outside_strings(text, lambda part: part.translate(_SMART_QUOTES))
+
+    def fix(part):
+        part = _TRAILING_COMMA.sub(r"\1", part)
+        return re.sub(r"\b(True|False|None)\b", lambda m: _PY_LITERALS[m.group(1)], part)
+
+    text = _outside_strings(text, fix)
+    text = _close_brackets(text.rstrip().rstrip(","))
+    return _outside_strings(text, lambda part: _TRAILING_COMMA.sub(r"\1", part))
+
+
+def _coerce_numbers(data, error: ValidationError) -> bool:
+    """Replace strings like "1,200 kg" with their number where the schema wants one."""
+    changed = False
+    for item in error.errors():
+        if item["type"] not in ("int_parsing", "float_parsing", "int_from_float"):
+            continue
+        *path, last = item["loc"]
+        try:
+            parent = data
+            for key in path:
+                parent = parent[key]
+            value = parent[last]
+        except (KeyError, IndexError, TypeError):
+            continue
+        if isinstance(value, float) and item["type"] == "int_from_float":
+            parent[last] = round(value)
+            changed = True
+        elif isinstance(value, str):
+            match = _NUMBER.search(value.replace(",", ""))
+            if match:
+                number = float(match.group())
+                parent[last] = round(number) if item["type"].startswith("int") else number
+                changed = True
+    return changed
+
+
+def parse_locally(content: str, schema: type[BaseModel]):
+    """Validate `content` as is, then after repair; returns (model, repaired) or raises."""
+    try:
+        return schema.model_validate_json(content), False
+    except ValidationError:
+        pass
+
+    candidate = extract_json(content)
+    if candidate is None:
+        raise StructuredOutputError("No JSON object in the model reply")
+    try:
+        data = json.loads(repair_json(candidate))
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Unrepairable JSON: {e}")
+
+    try:
+        return schema.model_validate(data), True
+    except ValidationError as e:
+        if not _coerce_numbers(data, e):
+            raise StructuredOutputError(str(e))
+    try:
+        return schema.model_validate(data), True
+    except ValidationError as e:
+        raise StructuredOutputError(str(e))
+
+
+def _failed_generation(error: requests.exceptions.HTTPError):
+    """The raw reply Groq rejects in JSON mode (400 json_validate_failed), if that is the error."""
+    if error.response is None or error.response.status_code != 400:
+        return None
+    try:
+        body = error.response.json().get("error", {})
+    except ValueError:
+        return None
+    return body.get("failed_generation") if body.get("code") == "json_validate_failed" else None
+
+
+def complete(payload: dict, schema: type[BaseModel], cache: str):
+    """
+    Run `payload` in JSON mode and return a `schema` instance. `cache` names
+    the endpoint for the LLM cache and the metrics. A repaired or re-asked
+    reply replaces the cached one, so cache hits stay clean.
+    """
+    payload = {**payload, "response_format": JSON_MODE}
+    try:
+        content = llm_client.chat_completion(payload, cache=cache)
+    except requests.exceptions.HTTPError as e:
+        content = _failed_generation(e)
+        if content is None:
+            raise
+        metrics.incr(f"structured.{cache}.json_mode_rejected")
+
+    try:
+        result, repaired = parse_locally(content, schema)
+        metrics.incr(f"structured.{cache}.{'repaired' if repaired else 'clean'}")
+        if repaired:
+            _recache(payload, cache, result)
+        return result
+    except StructuredOutputError as e:
+        problem = str(e)
+
+    # Last resort: one targeted re-ask with the validation error
+    reask = {
+        **payload,
+        "temperature": 0,
+        "messages": payload["messages"] + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": (
+                f"Your reply did not match the required JSON schema: {problem[:1000]}\n"
+                "Reply again with only the corrected JSON object."
+            )}
+        ]
+    }
+    try:
+        result, _ = parse_locally(llm_client.chat_completion(reask), schema)
+    except (StructuredOutputError, requests.exceptions.RequestException) as e:
+        metrics.incr(f"structured.{cache}.failed")
+        raise StructuredOutputError(f"Model reply could not be parsed: {e}")
+    metrics.incr(f"structured.{cache}.reasked")
+    _recache(payload, cache, result)
+    return result
+
+
+def _recache(payload: dict, cache: str, result: BaseModel):
+    if Config.LLM_CACHE_ENABLED:
+        llm_client.store_content(cache, llm_client.cache_key(payload), result.model_dump_json())
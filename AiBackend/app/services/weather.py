@@ -0,0 +1,156 @@
+# weather.py
+#
+# Single Open-Meteo client for every blueprint. The union of the daily
+# variables the routes need is fetched once per location cell and day, and
+# each route projects out the fields it uses.
+
+import datetime
+import threading
+
+import requests
+
+from app.config import Config
+from app.services.cache import TTLCache
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Response key -> Open-Meteo daily variable
+DAILY_FIELDS = {
+    "temp_max": "temperature_2m_max",
+    "temp_min": "temperature_2m_min",
+    "humidity_max": "relative_humidity_2m_max",
+    "humidity_min": "relative_humidity_2m_min",
+    "precipitation": "precipitation_sum",
+    "wind_speed_max": "wind_speed_10m_max",
+    "evapotranspiration": "evapotranspiration",
+}
+CURRENT_FIELDS = ["temperature_2m", "relative_humidity_2m", "precipitation", "wind_speed_10m"]
+
+# Field sets used by the routes
+FORECAST_FIELDS = ["temp_max", "temp_min", "humidity_max", "humidity_min", "precipitation", "wind_speed_max"]
+IRRIGATION_FIELDS = ["temp_max", "temp_min", "precipitation", "evapotranspiration"]
+
+DEFAULT_CURRENT_WEATHER = {
+    "temperature": 30,
+    "humidity": 50,
+    "precipitation": 0,
+    "windspeed": 10
+}
+
+_cache = TTLCache(maxsize=Config.WEATHER_CACHE_SIZE, ttl=Config.WEATHER_CACHE_TTL)
+_session = requests.Session()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def cell_key(lat, lon) -> tuple:
+    """Bucket coordinates into a grid cell so nearby requests share an entry."""
+    digits = Config.WEATHER_GRID_DECIMALS
+    return (round(float(lat), digits), round(float(lon), digits), datetime.date.today().isoformat())
+
+
+def _fetch(lat, lon, timeout: float = None) -> dict:
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "daily": ",".join(DAILY_FIELDS.values()),
+        "current": ",".join(CURRENT_FIELDS),
+        "forecast_days": 7,
+        "timezone": "auto",
+    }
+    response = _session.get(FORECAST_URL, params=params, timeout=timeout or Config.WEATHER_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_forecast(lat, lon, raise_errors: bool = False, timeout: float = None) -> dict:
+    """
+    Return the raw Open-Meteo forecast for the cell containing (lat, lon).
+    Concurrent misses on the same cell share one upstream request. Failures
+    are not cached and return {}, or raise with `raise_errors`; so do
+    coordinates that are not numbers. `timeout` overrides WEATHER_TIMEOUT.
+    """
+    try:
+        key = cell_key(lat, lon)
+    except (TypeError, ValueError) as e:
+        print(f"[ERROR] Invalid coordinates ({lat!r}, {lon!r}): {e}")
+        if raise_errors:
+            raise
+        return {}
+    data = _cache.get(key)
+    if data is not None:
+        return data
+
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+
+    if not leader:
+        event.wait(timeout or Config.WEATHER_TIMEOUT)
+        data = _cache.get(key)
+        if data is None and raise_errors:
+            raise RuntimeError("Weather fetch for this cell failed")
+        return data or {}
+
+    try:
+        # Query the cell centre so every member of the cell gets the same data
+        data = _fetch(key[0], key[1], timeout)
+        _cache.set(key, data)
+        return data
+    except Exception as e:
+        print(f"[ERROR] Weather fetch failed: {e}")
+        if raise_errors:
+            raise
+        return {}
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+def get_daily_forecast(lat, lon, fields=FORECAST_FIELDS) -> dict:
+    """7-day daily forecast with the given fields plus `dates`, or {} on failure."""
+    daily = get_forecast(lat, lon).get("daily")
+    if not daily:
+        return {}
+    forecast = {"dates": daily.get("time", [])}
+    for field in fields:
+        forecast[field] = daily.get(DAILY_FIELDS[field], [])
+    return forecast
+
+
+def _current_conditions(current: dict) -> dict:
+    return {
+        "temperature": current.get("temperature_2m", DEFAULT_CURRENT_WEATHER["temperature"]),
+        "humidity": current.get("relative_humidity_2m", DEFAULT_CURRENT_WEATHER["humidity"]),
+        "precipitation": current.get("precipitation", DEFAULT_CURRENT_WEATHER["precipitation"]),
+        "windspeed": current.get("wind_speed_10m", DEFAULT_CURRENT_WEATHER["windspeed"])
+    }
+
+
+def get_current_weather(lat, lon, raise_errors: bool = False, timeout: float = None) -> dict:
+    """
+    Current conditions, falling back to defaults for anything missing. With
+    `raise_errors`, a failed fetch raises instead of returning all defaults.
+    """
+    current = get_forecast(lat, lon, raise_errors, timeout).get("current", {})
+    if raise_errors and not current:
+        raise ValueError("Open-Meteo returned no current conditions")
+    return _current_conditions(current)
+
+
+def cached_current_weather(lat, lon):
+    """Current conditions if the cell's forecast is already cached, else None. Never fetches."""
+    try:
+        data = _cache.get(cell_key(lat, lon))
+    except (TypeError, ValueError):
+        return None
+    if not data or not data.get("current"):
+        return None
+    return _current_conditions(data["current"])
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,99 @@
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.config import Config
+from app.services import faiss_index
+
+# Build the memory-mapped FAISS copy of the Chroma collection (no re-embedding)
+# and compare its recall and latency with Chroma, e.g.
+#   python build_faiss_index.py --kind hnsw --quantizer sq8 --compare
+# Serve it with VECTOR_BACKEND=faiss.
+
+
+def load_collection(collection, page_size: int = 5000):
+    """All (ids, vectors, texts, metadatas) stored in the Chroma collection."""
+    ids, vectors, texts, metadatas = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        vectors.extend(page["embeddings"])
+        texts.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        offset += len(page["ids"])
+    return ids, np.asarray(vectors, dtype=np.float32), texts, metadatas
+
+
+def percentile(values: list[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))]
+
+
+def compare(collection, ids: list[str], vectors: np.ndarray, queries: int, k: int):
+    """Recall@k against exact search, and per-query latency, for FAISS and Chroma."""
+    index = faiss_index.FaissIndex(Config.FAISS_INDEX_DIR, nprobe=Config.FAISS_NPROBE, ef_search=Config.FAISS_EF_SEARCH)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    position = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    # Stored chunks with a little noise stand in for user queries
+    rng = np.random.default_rng(0)
+    sample = unit[rng.choice(len(unit), size=min(queries, len(unit)), replace=False)]
+    sample = sample + rng.normal(scale=0.05, size=sample.shape).astype(np.float32)
+    sample /= np.linalg.norm(sample, axis=1, keepdims=True)
+
+    exact = np.argsort(-(sample @ unit.T), axis=1)[:, :k]
+    results = {"faiss": ([], []), "chroma": ([], [])}
+    for query, truth in zip(sample, exact):
+        start = time.perf_counter()
+        _, found = index.search_ids(query, k)
+        results["faiss"][1].append((time.perf_counter() - start) * 1000)
+        results["faiss"][0].append(len(set(found.tolist()) & set(truth.tolist())) / k)
+
+        start = time.perf_counter()
+        hits = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        results["chroma"][1].append((time.perf_counter() - start) * 1000)
+        found = {position[chunk_id] for chunk_id in hits["ids"][0]}
+        results["chroma"][0].append(len(found & set(truth.tolist())) / k)
+
+    print(f"\n{len(sample)} queries, k={k}, recall against exact search:")
+    print(f"{'backend':<8} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for backend, (recalls, latencies) in results.items():
+        print(f"{backend:<8} {statistics.mean(recalls):>9.3f} "
+              f"{percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.95):>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped FAISS index from the Chroma collection.")
+    parser.add_argument("--kind", choices=["flat", "ivf", "hnsw"], default="hnsw")
+    parser.add_argument("--quantizer", help="Store int8 (sq8) or product-quantized (e.g. pq16) codes instead of float32")
+    parser.add_argument("--compare", action="store_true", help="Report recall/latency against Chroma after building")
+    parser.add_argument("--skip-build", action="store_true", help="Only run the comparison on the existing index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    import chromadb
+
+    client = chromadb.PersistentClient(path=Config.VECTOR_PERSIST_DIR)
+    collection = client.get_collection(Config.VECTOR_COLLECTION)
+
+    start = time.perf_counter()
+    ids, vectors, texts, metadatas = load_collection(collection)
+    print(f"Read {len(ids)} chunks from '{Config.VECTOR_COLLECTION}' in {time.perf_counter() - start:.1f}s")
+
+    if not args.skip_build:
+        spec = faiss_index.index_spec(args.kind, len(ids), args.quantizer)
+        start = time.perf_counter()
+        faiss_index.write_index(Config.FAISS_INDEX_DIR, spec, vectors, texts, metadatas, Config.EMBED_MODEL)
+        print(f"Built {spec} index in '{Config.FAISS_INDEX_DIR}' in {time.perf_counter() - start:.1f}s")
+
+    if args.compare:
+        compare(collection, ids, vectors, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,165 @@
+import argparse
+import hashlib
+import json
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.config import Config
+
+# Incrementally (re)build the agri_collection from the PDFs in ./app/data/.
+# A manifest of file hashes next to the collection records what was indexed,
+# so only new or changed PDFs are parsed and embedded, and chunks of deleted
+# or replaced PDFs are removed. Full rebuild:
+#   python create_vectorstore.py --rebuild
 
 # Path to your folder containing only PDFs
 pdf_folder_path = "./app/data/"
+manifest_path = os.path.join(Config.VECTOR_PERSIST_DIR, "manifest.json")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_and_split(file_path: str) -> tuple[int, list[tuple[str, dict]]]:
+    """
+    Parse one PDF and split it into chunks with overlap. Runs in a worker
+    process; returns (pages, [(text, metadata), ...]).
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    pages = PyPDFLoader(file_path).load()
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=150,
+    )
+    chunks = text_splitter.split_documents(pages)
+    return len(pages), [(chunk.page_content, chunk.metadata) for chunk in chunks]
+
+
+def load_manifest() -> dict:
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally build the agricultural vector store.")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the collection and index every PDF again")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="PDF parsing processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks embedded and written per batch")
+    args = parser.parse_args()
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from langchain_community.vectorstores import Chroma
+
+    start = time.perf_counter()
+
+    # Initialize embedding function and the persisted collection
+    embedding_function = HuggingFaceEmbeddings(model_name=Config.EMBED_MODEL)
+    vectorstore = Chroma(
+        collection_name=Config.VECTOR_COLLECTION,
+        persist_directory=Config.VECTOR_PERSIST_DIR,
+        embedding_function=embedding_function
+    )
+
+    manifest = load_manifest()
+    # A collection built before the manifest existed has chunk ids we cannot
+    # map back to files, so it has to be rebuilt once
+    if args.rebuild or (not manifest and vectorstore._collection.count() > 0):
+        print("Rebuilding the collection from scratch")
+        vectorstore.delete_collection()
+        vectorstore = Chroma(
+            collection_name=Config.VECTOR_COLLECTION,
+            persist_directory=Config.VECTOR_PERSIST_DIR,
+            embedding_function=embedding_function
+        )
+        manifest = {}
+        save_manifest(manifest)
+
+    # Step 1: Diff the folder against the manifest
+    current = {
+        filename: file_sha256(os.path.join(pdf_folder_path, filename))
+        for filename in sorted(os.listdir(pdf_folder_path))
+        if filename.endswith(".pdf")
+    }
+    to_index = [name for name, digest in current.items() if manifest.get(name, {}).get("sha256") != digest]
+    removed = [name for name in manifest if name not in current]
+    changed = [name for name in to_index if name in manifest]
+    print(f"PDFs: {len(current)} total, {len(current) - len(to_index)} unchanged, "
+          f"{len(to_index) - len(changed)} new, {len(changed)} changed, {len(removed)} deleted")
+
+    # Step 2: Drop chunks of deleted and changed files
+    for name in removed + changed:
+        ids = manifest.pop(name)["ids"]
+        if ids:
+            vectorstore.delete(ids=ids)
+    if removed or changed:
+        save_manifest(manifest)
+
+    # Step 3: Parse new/changed PDFs in parallel; embed each as it arrives
+    total_pages = total_chunks = 0
+    embed_seconds = 0.0
+    if to_index:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(to_index))) as pool:
+            futures = {
+                pool.submit(load_and_split, os.path.join(pdf_folder_path, name)): name
+                for name in to_index
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                name = futures[future]
+                try:
+                    pages, chunks = future.result()
+                except Exception as e:
+                    print(f"[ERROR] Could not parse {name}: {e}")
+                    continue
+
+                digest = current[name]
+                # Ids are unique per file version, so identical copies under two names don't collide
+                prefix = hashlib.sha256(f"{name}:{digest}".encode("utf-8")).hexdigest()[:16]
+                ids = [f"{prefix}-{i}" for i in range(len(chunks))]
+                embed_start = time.perf_counter()
+                for offset in range(0, len(chunks), args.batch_size):
+                    batch = chunks[offset:offset + args.batch_size]
+                    vectorstore.add_texts(
+                        texts=[text for text, _ in batch],
+                        metadatas=[metadata for _, metadata in batch],
+                        ids=ids[offset:offset + args.batch_size]
+                    )
+                embed_seconds += time.perf_counter() - embed_start
+
+                manifest[name] = {"sha256": digest, "pages": pages, "ids": ids}
+                save_manifest(manifest)
+                total_pages += pages
+                total_chunks += len(chunks)
+                elapsed = time.perf_counter() - start
+                print(f"[{done}/{len(to_index)}] {name}: {pages} pages, {len(chunks)} chunks "
+                      f"({total_chunks / elapsed:.1f} chunks/s overall)")
+
+    # Step 4: Report
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {total_pages} pages into {total_chunks} chunks in {elapsed:.1f}s "
+          f"(embedding + write {embed_seconds:.1f}s"
+          + (f", {total_chunks / embed_seconds:.1f} chunks/s" if embed_seconds else "") + ")")
+    print(f"Collection '{Config.VECTOR_COLLECTION}' now holds {vectorstore._collection.count()} chunks "
+          f"in '{Config.VECTOR_PERSIST_DIR}'")
+
 
-# Function to load documents only from PDF files
-def load_pdfs_from_folder(pdf_path):
-    documents = []
-    for filename in os.listdir(pdf_path):
-        if filename.endswith(".pdf"):
-            file_path = os.path.join(pdf_path, filename)
-            loader = PyPDFLoader(file_path)
-            documents.extend(loader.load())
-    return documents
-
-# Load documents from the PDF folder
-documents = load_pdfs_from_folder(pdf_folder_path)
-
-print(f"Total PDF documents loaded: {len(documents)}")
-
-# Split documents into chunks with overlap
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=150,
-)
-split_documents = text_splitter.split_documents(documents)
-
-# Initialize embedding function
-embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-# Set Chroma vector store config
-collection_name = "agri_collection"
-persist_directory = "./app/chromadb"
-
-# Create and persist the vector store
-vectorstore = Chroma.from_documents(
-    documents=split_documents,
-    embedding=embedding_function,
-    collection_name=collection_name,
-    persist_directory=persist_directory
-)
-
-vectorstore.persist()
-
-# Optional: Set up the retriever
-retriever = vectorstore.as_retriever()
-
-print(f"Vector store created and persisted to '{persist_directory}'")
\ No newline at end of file
+# The guard keeps worker processes (spawned, on Windows) from re-running the build
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# gunicorn.conf.py
+#
+# Production entrypoint for the AI backend:
+#   gunicorn -c gunicorn.conf.py run:app
+#
+# Routes spend nearly all their time waiting on Groq, Open-Meteo and
+# OpenEPI. The default gthread workers serve each request on one of
+# `threads` threads, and those threads mostly sit in socket waits, so a
+# worker keeps dozens of upstream calls in flight. Size `workers` to the CPU
+# count and `threads` to the concurrency you need.
+#
+# GUNICORN_WORKER_CLASS=gevent multiplexes hundreds of calls per worker on
+# greenlets instead. Agent sets and SQLite connections are pooled rather
+# than thread-local, so they survive the per-connection greenlets, but
+# anything that blocks in C still stalls the whole worker: CPU-bound work
+# (embeddings, PDF parsing, image resizing) and SQLite lock waits on the
+# shared cache. Prefer it only for I/O-heavy deployments.
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count())))
+
+# gthread: threads per worker; gevent: concurrent requests per worker
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "500"))
+
+# LLM answers and agent runs can take a minute; streams hold the connection longer
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth in long-lived ML libraries
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = 500
+
+# Models, vector stores and agents are built per worker after fork (lazily or
+# via WARMUP_ON_START), so the app is not preloaded in the master
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+
+# Let one worker keep as many pooled Groq connections as it has calls in
+# flight; the app reads this when the worker imports it
+concurrency = worker_connections if worker_class == "gevent" else threads
+os.environ.setdefault("GROQ_POOL_SIZE", str(concurrency))
+# Fan-out threads for every request's upstream calls (up to 3 per request)
+os.environ.setdefault("FANOUT_WORKERS", str(3 * concurrency))
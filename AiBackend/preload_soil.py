@@ -0,0 +1,23 @@
+import argparse
+import time
+
+from app.config import Config
+from app.services import soil
+
+# Warm the persistent soil tile cache for a district's bounding box, e.g.
+#   python preload_soil.py --bbox 10.6 76.8 11.2 77.3
+
+parser = argparse.ArgumentParser(description="Pre-load OpenEPI soil tiles into the local cache.")
+parser.add_argument("--bbox", nargs=4, type=float, required=True,
+                    metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"))
+parser.add_argument("--workers", type=int, default=4, help="Concurrent OpenEPI requests")
+parser.add_argument("--refresh", action="store_true", help="Re-fetch cells that are already cached")
+args = parser.parse_args()
+
+start = time.perf_counter()
+summary = soil.preload_bbox(*args.bbox, workers=args.workers, refresh=args.refresh)
+elapsed = time.perf_counter() - start
+
+print(f"Cells in bbox: {summary['cells']} (grid {Config.SOIL_GRID_DEG}°)")
+print(f"Loaded: {summary['loaded']}, failed: {summary['failed']} in {elapsed:.1f}s")
+print(f"Tiles now cached in '{Config.SOIL_CACHE_PATH}': {soil.get_store().count()}")
@@ -1,6 +1,13 @@
+import os
+
 from app import create_app
 
 app = create_app()
 
+# Development server only; in production use `gunicorn -c gunicorn.conf.py run:app`
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5002, debug=True)
\ No newline at end of file
+    app.run(
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "5002")),
+        debug=os.getenv("FLASK_DEBUG", "false").lower() == "true"
+    )